@@ -0,0 +1,156 @@
+import os
+import sys
+import time
+import asyncio
+import logging
+import argparse
+import datetime
+import jwt
+
+os.environ.setdefault("TOKEN_SECRET_KEY", "benchmark-secret-key")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from starlette.middleware import Middleware  # noqa: E402
+from utils import constants, fair_queuing, redirect_requests  # noqa: E402
+from utils.splunk_logging import logger  # noqa: E402
+from utils.fast_path import FastPathRouter  # noqa: E402
+import app as gateway  # noqa: E402
+
+
+BENCHMARK_ONBOARDING_CONFIG = {
+    "api-name": "demo",
+    "namespace": "demo-namespace",
+    "port": 8000,
+    "version": "v1",
+    "endpoints": [
+        {"/public/*": {"GET": "NO_AUTHENTICATION"}},
+        {"/private/*": {"GET": "AUTHENTICATE"}},
+    ],
+}
+
+
+class UpstreamResponse:
+    status = 200
+    headers = {"content-type": "application/json", "content-length": "2"}
+
+    async def read(self) -> bytes:
+        return b"{}"
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+
+class UpstreamSession:
+    # Answers instantly so the benchmark only measures the gateway's own per-request overhead
+    def request(self, **kwargs) -> UpstreamResponse:
+        return UpstreamResponse()
+
+
+async def get_upstream_session() -> UpstreamSession:
+    return UpstreamSession()
+
+
+def build_gateway(fast_path: bool):
+    user_middleware = [middleware for middleware in gateway.app.user_middleware if middleware.cls is not FastPathRouter]
+    if fast_path:
+        user_middleware.insert(0, Middleware(FastPathRouter))
+
+    gateway.app.user_middleware = user_middleware
+    gateway.app.middleware_stack = None
+    return gateway.app
+
+
+async def call_gateway(app, path: str, headers: list) -> int:
+    scope = {
+        "type": "http",
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": b"",
+        "headers": headers,
+        "client": ("10.0.0.1", 12345),
+        "server": ("gateway", 8000),
+    }
+    request_sent = False
+    status_code = None
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await asyncio.Event().wait()
+
+    async def send(message):
+        nonlocal status_code
+        if message["type"] == "http.response.start":
+            status_code = message["status"]
+
+    await app(scope, receive, send)
+    return status_code
+
+
+async def measure(app, path: str, headers: list, requests: int, concurrency: int) -> float:
+    remaining = requests
+
+    async def worker():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            status_code = await call_gateway(app, path, headers)
+            if status_code != 200:
+                raise RuntimeError(f"Unexpected status code {status_code} for {path}")
+
+    start_time = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return requests / (time.perf_counter() - start_time)
+
+
+async def main(arguments: argparse.Namespace) -> None:
+    token = jwt.encode(
+        {"sub": "benchmark", "exp": datetime.datetime.utcnow() + datetime.timedelta(hours=1)},
+        constants.TOKEN_SECRET_KEY,
+        algorithm=constants.ALGORITHM
+    )
+    scenarios = {
+        "NO_AUTHENTICATION": ("/demo/api/v1/public/resource", [(b"host", b"gateway")]),
+        "AUTHENTICATE": (
+            "/demo/api/v1/private/resource",
+            [(b"host", b"gateway"), (b"authorization", f"Bearer {token}".encode())]
+        ),
+    }
+
+    print(f"{'scenario':<20}{'FastAPI rps':>14}{'fast path rps':>16}{'speedup':>10}")
+    for name, (path, headers) in scenarios.items():
+        results = {}
+        for fast_path in (False, True):
+            app = build_gateway(fast_path)
+            await measure(app, path, headers, arguments.warmup, arguments.concurrency)
+            results[fast_path] = max(
+                [await measure(app, path, headers, arguments.requests, arguments.concurrency) for _ in range(arguments.rounds)]
+            )
+        print(f"{name:<20}{results[False]:>14.0f}{results[True]:>16.0f}{results[True] / results[False]:>9.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare requests per second of the FastAPI routes and the fast path router")
+    parser.add_argument("--requests", type=int, default=5000, help="Requests per measurement round")
+    parser.add_argument("--rounds", type=int, default=3, help="Measurement rounds per scenario; the best one is reported")
+    parser.add_argument("--warmup", type=int, default=500, help="Requests sent before measuring")
+    parser.add_argument("--concurrency", type=int, default=32, help="Requests in flight")
+    arguments = parser.parse_args()
+
+    logger.handlers = [logging.NullHandler()]
+    constants.ENDPOINT_RULES.clear()
+    constants.populate_endpoint_rules(BENCHMARK_ONBOARDING_CONFIG)
+    redirect_requests.get_client_session = get_upstream_session
+    # Measures gateway overhead, so the opt-in rate limit must not turn requests into 429s
+    fair_queuing.RATE_LIMIT_PER_SECOND = 0
+
+    asyncio.run(main(arguments))
@@ -0,0 +1,161 @@
+import os
+import sys
+import time
+import asyncio
+import logging
+import argparse
+import datetime
+import statistics
+import jwt
+
+os.environ.setdefault("TOKEN_SECRET_KEY", "benchmark-secret-key")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from utils import constants, fair_queuing, redirect_requests  # noqa: E402
+from utils.splunk_logging import logger  # noqa: E402
+from utils.fast_path import FastPathRouter  # noqa: E402
+
+
+BENCHMARK_ONBOARDING_CONFIG = {
+    "api-name": "demo",
+    "namespace": "demo-namespace",
+    "port": 8000,
+    "version": "v1",
+    "endpoints": [{"/private/*": {"GET": "AUTHENTICATE"}}],
+}
+
+
+class UpstreamResponse:
+    status = 200
+    headers = {"content-type": "application/json", "content-length": "2"}
+
+    def __init__(self, connections: asyncio.Semaphore, service_time: float):
+        self.connections = connections
+        self.service_time = service_time
+
+    async def read(self) -> bytes:
+        return b"{}"
+
+    async def __aenter__(self):
+        await self.connections.acquire()
+        await asyncio.sleep(self.service_time)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.connections.release()
+
+
+class UpstreamSession:
+    # Mimics the aiohttp connector: a fixed number of connections handed out first come, first served
+    def __init__(self, capacity: int, service_time: float):
+        self.connections = asyncio.Semaphore(capacity)
+        self.service_time = service_time
+
+    def request(self, **kwargs) -> UpstreamResponse:
+        return UpstreamResponse(self.connections, self.service_time)
+
+
+async def call_gateway(app, path: str, headers: list) -> int:
+    scope = {
+        "type": "http",
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": b"",
+        "headers": headers,
+        "client": ("10.0.0.1", 12345),
+        "server": ("gateway", 8000),
+    }
+    request_sent = False
+    status_code = None
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await asyncio.Event().wait()
+
+    async def send(message):
+        nonlocal status_code
+        if message["type"] == "http.response.start":
+            status_code = message["status"]
+
+    await app(scope, receive, send)
+    return status_code
+
+
+def authorization_headers(username: str) -> list:
+    token = jwt.encode(
+        {"sub": username, "exp": datetime.datetime.utcnow() + datetime.timedelta(hours=1)},
+        constants.TOKEN_SECRET_KEY,
+        algorithm=constants.ALGORITHM
+    )
+    return [(b"host", b"gateway"), (b"authorization", f"Bearer {token}".encode())]
+
+
+async def measure(arguments: argparse.Namespace, fair: bool) -> list:
+    session = UpstreamSession(arguments.upstream_capacity, arguments.service_time)
+
+    async def get_upstream_session() -> UpstreamSession:
+        return session
+
+    redirect_requests.get_client_session = get_upstream_session
+    # Without fair queuing every request goes straight to the connector and waits there in arrival order
+    fair_queuing.UPSTREAM_QUEUE = fair_queuing.FairQueue(arguments.upstream_capacity if fair else sys.maxsize)
+
+    app = FastPathRouter(None)
+    stop = asyncio.Event()
+    noisy_headers = authorization_headers("noisy")
+    quiet_headers = authorization_headers("quiet")
+    latencies = []
+
+    async def noisy_worker():
+        while not stop.is_set():
+            await call_gateway(app, "/demo/api/v1/private/resource", noisy_headers)
+
+    async def quiet_worker():
+        for _ in range(arguments.requests):
+            start_time = time.perf_counter()
+            status_code = await call_gateway(app, "/demo/api/v1/private/resource", quiet_headers)
+            if status_code != 200:
+                raise RuntimeError(f"Unexpected status code {status_code}")
+            latencies.append((time.perf_counter() - start_time) * 1000)
+            await asyncio.sleep(arguments.interval)
+
+    noisy = [asyncio.ensure_future(noisy_worker()) for _ in range(arguments.noisy_concurrency)]
+    await asyncio.sleep(arguments.service_time)
+    await quiet_worker()
+    stop.set()
+    await asyncio.gather(*noisy)
+    return latencies
+
+
+async def main(arguments: argparse.Namespace) -> None:
+    print(f"{'scheduler':<14}{'quiet p50 ms':>14}{'quiet p99 ms':>14}{'quiet max ms':>14}")
+    for name, fair in (("FIFO", False), ("fair queue", True)):
+        latencies = sorted(await measure(arguments, fair))
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+        print(f"{name:<14}{statistics.median(latencies):>14.1f}{p99:>14.1f}{latencies[-1]:>14.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Measure a quiet user's latency while a noisy user floods the same upstream, with and without fair queuing"
+    )
+    parser.add_argument("--requests", type=int, default=200, help="Requests sent by the quiet user")
+    parser.add_argument("--interval", type=float, default=0.005, help="Seconds between the quiet user's requests")
+    parser.add_argument("--noisy-concurrency", type=int, default=200, help="Requests the noisy user keeps in flight")
+    parser.add_argument("--upstream-capacity", type=int, default=20, help="Upstream connections available")
+    parser.add_argument("--service-time", type=float, default=0.01, help="Seconds the upstream takes per request")
+    arguments = parser.parse_args()
+
+    logger.handlers = [logging.NullHandler()]
+    constants.ENDPOINT_RULES.clear()
+    constants.populate_endpoint_rules(BENCHMARK_ONBOARDING_CONFIG)
+    fair_queuing.RATE_LIMIT_PER_SECOND = 0
+
+    asyncio.run(main(arguments))
@@ -0,0 +1,144 @@
+import os
+import sys
+import time
+import asyncio
+import argparse
+import datetime
+import jwt
+from aiohttp import ClientSession, ClientTimeout, TCPConnector
+
+
+# Must match utils.constants.ALGORITHM so the gateway accepts the minted token
+ALGORITHM = "HS256"
+
+
+def read_rss_bytes(pid: int) -> int:
+    with open(f"/proc/{pid}/status", encoding="utf-8") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) * 1024
+
+    raise RuntimeError(f"VmRSS not found for process {pid}")
+
+
+async def hold_websocket(session: ClientSession, url: str, headers: dict, opened: asyncio.Event, stop: asyncio.Event, interval: float, stats: dict):
+    async with session.ws_connect(url, headers=headers) as websocket:
+        stats["open"] += 1
+        opened.set()
+        while not stop.is_set():
+            await websocket.send_str("ping")
+            await websocket.receive()
+            stats["messages"] += 1
+            try:
+                await asyncio.wait_for(stop.wait(), interval)
+            except asyncio.TimeoutError:
+                pass
+
+
+async def hold_event_stream(session: ClientSession, url: str, headers: dict, opened: asyncio.Event, stop: asyncio.Event, interval: float, stats: dict):
+    async with session.get(url, headers={**headers, "Accept": "text/event-stream"}) as response:
+        if response.status != 200:
+            raise RuntimeError(f"Unexpected status code {response.status}")
+        stats["open"] += 1
+        opened.set()
+        while not stop.is_set():
+            read = asyncio.ensure_future(response.content.readany())
+            stopped = asyncio.ensure_future(stop.wait())
+            await asyncio.wait([read, stopped], return_when=asyncio.FIRST_COMPLETED)
+            stopped.cancel()
+            if read.done():
+                stats["messages"] += 1
+            else:
+                read.cancel()
+
+
+async def open_connection(hold, session, url, headers, stop, interval, stats) -> asyncio.Task:
+    opened = asyncio.Event()
+    task = asyncio.ensure_future(hold(session, url, headers, opened, stop, interval, stats))
+    await asyncio.wait([task, asyncio.ensure_future(opened.wait())], return_when=asyncio.FIRST_COMPLETED)
+    if task.done():
+        task.result()
+    return task
+
+
+async def soak(arguments: argparse.Namespace) -> None:
+    token = jwt.encode(
+        {"sub": arguments.username, "exp": datetime.datetime.utcnow() + datetime.timedelta(hours=8)},
+        os.environ["TOKEN_SECRET_KEY"],
+        algorithm=ALGORITHM
+    )
+    headers = {"Authorization": f"Bearer {token}"}
+    hold = hold_websocket if arguments.mode == "websocket" else hold_event_stream
+    target = arguments.target.rstrip("/")
+    if arguments.mode == "websocket":
+        target = f"ws{target[len('http'):]}"
+    url = f"{target}{arguments.path}"
+
+    stats = {"open": 0, "messages": 0}
+    stop = asyncio.Event()
+    connector = TCPConnector(limit=0)
+    async with ClientSession(connector=connector, timeout=ClientTimeout(total=None)) as session:
+        baseline_rss = read_rss_bytes(arguments.pid)
+        start_time = time.perf_counter()
+        tasks = []
+        for _ in range(arguments.connections):
+            tasks.append(await open_connection(hold, session, url, headers, stop, arguments.interval, stats))
+        print(f"Opened {stats['open']} {arguments.mode} connections in {time.perf_counter() - start_time:.1f}s")
+
+        await asyncio.sleep(arguments.settle)
+        opened_rss = read_rss_bytes(arguments.pid)
+
+        samples = []
+        soak_start = time.perf_counter()
+        while time.perf_counter() - soak_start < arguments.duration:
+            await asyncio.sleep(min(arguments.sample_interval, arguments.duration))
+            samples.append(read_rss_bytes(arguments.pid))
+            failed = [task for task in tasks if task.done()]
+            if failed:
+                for task in failed:
+                    if task.exception():
+                        print(f"Connection failed: {task.exception()!r}", file=sys.stderr)
+                sys.exit(f"{len(failed)} connections closed during the soak")
+
+        stop.set()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    await asyncio.sleep(arguments.settle)
+    closed_rss = read_rss_bytes(arguments.pid)
+
+    mib = 1024 * 1024
+    print(f"Relayed messages:         {stats['messages']}")
+    print(f"Gateway RSS before:       {baseline_rss / mib:.1f} MiB")
+    print(f"Gateway RSS while open:   {opened_rss / mib:.1f} MiB")
+    print(f"Gateway RSS during soak:  min {min(samples) / mib:.1f} MiB, max {max(samples) / mib:.1f} MiB")
+    print(f"Gateway RSS after close:  {closed_rss / mib:.1f} MiB")
+    print(f"Memory per connection:    {(opened_rss - baseline_rss) / arguments.connections / 1024:.1f} KiB")
+    print(f"Growth during soak:       {(samples[-1] - opened_rss) / arguments.connections / 1024:.1f} KiB per connection")
+
+
+def parse_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Hold many WebSocket or SSE connections open through the gateway and measure its memory per connection"
+    )
+    parser.add_argument("--pid", type=int, required=True, help="PID of the gateway process (its RSS is read from /proc)")
+    parser.add_argument("--target", default="http://localhost:8000", help="Base URL of the gateway")
+    parser.add_argument("--mode", choices=("websocket", "sse"), default="websocket")
+    parser.add_argument("--path", help="Onboarded path to connect to (defaults to the demo API's ws/events endpoint)")
+    parser.add_argument("--username", default="alice", help="User to mint the bearer token for")
+    parser.add_argument("--connections", type=int, default=200, help="Concurrent connections to hold open")
+    parser.add_argument("--duration", type=float, default=60, help="Seconds to hold the connections open")
+    parser.add_argument("--interval", type=float, default=5, help="Seconds between WebSocket messages per connection")
+    parser.add_argument("--settle", type=float, default=2, help="Seconds to wait before reading RSS after opening/closing")
+    parser.add_argument("--sample-interval", type=float, default=5, help="Seconds between RSS samples during the soak")
+    arguments = parser.parse_args()
+
+    if arguments.path is None:
+        arguments.path = "/demo/api/v1/example/ws" if arguments.mode == "websocket" else "/demo/api/v1/example/events"
+    if not os.getenv("TOKEN_SECRET_KEY"):
+        sys.exit("TOKEN_SECRET_KEY must be set to mint a token")
+
+    return arguments
+
+
+if __name__ == "__main__":
+    asyncio.run(soak(parse_arguments()))
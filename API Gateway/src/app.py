@@ -1,24 +1,31 @@
-import time
-
-from aiohttp import ServerTimeoutError, ClientPayloadError, ClientResponseError, ClientConnectorError
-from fastapi import FastAPI, Depends, HTTPException, status, Request
-from fastapi.responses import Response, JSONResponse
-from fastapi.security import OAuth2PasswordRequestForm
+from typing import Annotated
+from fastapi import FastAPI, Depends, HTTPException, status, Request, WebSocket
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.security import OAuth2PasswordRequestForm, HTTPAuthorizationCredentials
 from starlette.middleware import Middleware
 from starlette_context.middleware import RawContextMiddleware
 from starlette_context.plugins import RequestIdPlugin
 from starlette_context import context
-from utils.splunk_logging import LoggingMiddleware, error_response, log_exception
-from utils.authorization import create_jwt_token, authorize_redirects
-from utils.database_and_client import lifespan, get_password_from_database, get_client_session
-from utils.constants import PASSWORD_CONTEXT
-from utils.redirect_requests import generate_url_for_redirect, generate_headers
+from utils.splunk_logging import LoggingMiddleware, error_response
+from utils.authorization import create_jwt_token, authorize_redirects, BEARER_TOKEN
+from utils.database_and_client import lifespan, get_password_from_database
+from utils.constants import PASSWORD_CONTEXT, PROXY_METHODS, FAST_PATH_ROUTER_ENABLED
+from utils.redirect_requests import generate_url_for_redirect, generate_headers, forward_request
+from utils.fast_path import FastPathRouter
+from utils.deadline import DeadlineMiddleware
+from utils.health import HealthCheckMiddleware
+from utils.streaming import accepts_event_stream, forward_event_stream, redirect_websocket
+from utils.batch_requests import BatchRequest, execute_batch, gather_batch_results, stream_batch_results
 
 
 middlewares = [
     Middleware(RawContextMiddleware, plugins=(RequestIdPlugin(),)),
+    Middleware(DeadlineMiddleware),
     Middleware(LoggingMiddleware)
 ]
+if FAST_PATH_ROUTER_ENABLED:
+    middlewares.insert(0, Middleware(FastPathRouter))
+middlewares.insert(0, Middleware(HealthCheckMiddleware))
 exception_handlers = {500: error_response}
 app = FastAPI(
     title="API Gateway",
@@ -44,41 +51,39 @@ async def login(credentials: OAuth2PasswordRequestForm = Depends()):
     )
 
 
-@app.get("/{api_name}/api/{version}/{endpoint:path}", dependencies=[Depends(authorize_redirects)])
-@app.post("/{api_name}/api/{version}/{endpoint:path}", dependencies=[Depends(authorize_redirects)])
-@app.put("/{api_name}/api/{version}/{endpoint:path}", dependencies=[Depends(authorize_redirects)])
-@app.delete("/{api_name}/api/{version}/{endpoint:path}", dependencies=[Depends(authorize_redirects)])
+@app.post("/batch")
+async def batch_requests(
+        request: Request,
+        batch: BatchRequest,
+        token: Annotated[HTTPAuthorizationCredentials, Depends(BEARER_TOKEN)]
+):
+    tasks = execute_batch(request, batch, token)
+
+    if batch.stream:
+        return StreamingResponse(stream_batch_results(tasks), media_type="application/x-ndjson")
+
+    return JSONResponse(
+        status_code=status.HTTP_200_OK,
+        content={"responses": await gather_batch_results(tasks)}
+    )
+
+
+@app.api_route(
+    "/{api_name}/api/{version}/{endpoint:path}",
+    methods=PROXY_METHODS,
+    dependencies=[Depends(authorize_redirects)]
+)
 async def redirect_requests(request: Request, api_name: str, version: str, endpoint: str):
-    try:
-        context["backend_start_time"] = time.time()
-        async with (await get_client_session()).request(
-                method=request.method,
-                url=generate_url_for_redirect(endpoint, request.query_params),
-                headers=generate_headers(request),
-                data=await request.body(),
-        ) as response:
-            content = await response.read()
-            context["backend_end_time"] = time.time()
-            return Response(
-                content=content,
-                status_code=response.status,
-                headers=response.headers,
-                media_type=response.headers.get("content-type"),
-            )
-    except (ClientPayloadError, ClientConnectorError) as e:
-        log_exception("Bad Gateway", e)
-        raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY)
-    except ClientResponseError as e:
-        if e.status == 503:
-            log_exception("Service Unavailable", e)
-            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE)
-        log_exception("Bad Gateway", e)
-        raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY)
-    except ServerTimeoutError as e:
-        log_exception("Gateway Timeout", e)
-        raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT)
-    except Exception as e:
-        log_exception("Internal Server Error", e)
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    forward = forward_event_stream if accepts_event_stream(request) else forward_request
+    return await forward(
+        context,
+        request.method,
+        generate_url_for_redirect(endpoint, request.query_params),
+        generate_headers(request),
+        await request.body(),
+    )
 
 
+@app.websocket("/{api_name}/api/{version}/{endpoint:path}")
+async def redirect_websockets(websocket: WebSocket, api_name: str, version: str, endpoint: str):
+    await redirect_websocket(websocket, api_name, version, endpoint)
@@ -2,15 +2,19 @@ import traceback
 import datetime
 import re
 import jwt
-from typing import Annotated, Dict, Union, List
+from typing import Annotated, Any, Awaitable, Callable, Dict, List, MutableMapping, Optional
 from fastapi import Request, Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from fastapi.security.utils import get_authorization_scheme_param
+from starlette.requests import HTTPConnection
 from starlette_context import context
 from .constants import (
     TOKEN_SECRET_KEY, ALGORITHM, ENDPOINT_RULES, AUTHENTICATE_FLAG, NO_AUTHENTICATION_FLAG, DENY_ALL_ACCESS_FLAG
 )
 from .splunk_logging import logger
 from .database_and_client import get_user_groups_from_database
+from .deadline import check_deadline
+from .fair_queuing import check_rate_limit
 
 
 BEARER_TOKEN = HTTPBearer(
@@ -33,6 +37,14 @@ def create_jwt_token(username: str) -> str:
     return token
 
 
+def get_bearer_token(connection: HTTPConnection) -> Optional[HTTPAuthorizationCredentials]:
+    scheme, credentials = get_authorization_scheme_param(connection.headers.get("Authorization"))
+    if scheme.lower() != "bearer" or not credentials:
+        return None
+
+    return HTTPAuthorizationCredentials(scheme=scheme, credentials=credentials)
+
+
 def decode_and_check_jwt_token(token: Annotated[HTTPAuthorizationCredentials, Depends(BEARER_TOKEN)]) -> str:
     try:
         payload = jwt.decode(token.credentials, TOKEN_SECRET_KEY, ALGORITHM)
@@ -50,7 +62,7 @@ def decode_and_check_jwt_token(token: Annotated[HTTPAuthorizationCredentials, De
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
 
 
-def get_endpoint_authorization_config(api_name: str, version: str, endpoint: str) -> Dict[str, Union[str, List[str]]]:
+def get_endpoint_authorization_config(api_name: str, version: str, endpoint: str) -> Dict[str, Any]:
     if api_name not in ENDPOINT_RULES or version not in ENDPOINT_RULES[api_name]:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
 
@@ -62,26 +74,31 @@ def get_endpoint_authorization_config(api_name: str, version: str, endpoint: str
     raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
 
 
-async def authorize_redirects(
-        request: Request,
+def get_group_names_with_no_flags(authorization_groups: List[str]) -> List[str]:
+    return list(set(authorization_groups).difference({AUTHENTICATE_FLAG, NO_AUTHENTICATION_FLAG}))
+
+
+async def authorize_request(
+        authorization: MutableMapping[str, Any],
+        method: str,
         api_name: str,
         version: str,
         endpoint: str,
-        token: Annotated[HTTPAuthorizationCredentials, Depends(BEARER_TOKEN)]
+        get_username: Callable[[], str],
+        get_user_groups: Callable[[str, List[str]], Awaitable[List[Dict[str, str]]]]
 ) -> None:
-    context["api_name"] = api_name
-    context["version"] = version
-    endpoint = f"/{endpoint}"
+    check_deadline("authorization")
     authorization_config = get_endpoint_authorization_config(api_name, version, endpoint)
-    context["url"] = authorization_config["url"]
+    authorization["url"] = authorization_config["url"]
+    authorization["timeout"] = authorization_config["timeout"]
 
-    if request.method not in authorization_config:
+    if method not in authorization_config["methods"]:
         raise HTTPException(status_code=status.HTTP_405_METHOD_NOT_ALLOWED)
 
-    authorization_groups = authorization_config.get(request.method)
+    authorization_groups = authorization_config["methods"][method]
 
     if DENY_ALL_ACCESS_FLAG in authorization_groups:
-        context["group"] = DENY_ALL_ACCESS_FLAG
+        authorization["group"] = DENY_ALL_ACCESS_FLAG
         logger.info(
             {
                 "message": f"{DENY_ALL_ACCESS_FLAG} flag matched",
@@ -90,16 +107,16 @@ async def authorize_redirects(
         )
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN)
 
-    group_names_with_no_flags = list(set(authorization_groups).difference({AUTHENTICATE_FLAG, NO_AUTHENTICATION_FLAG}))
+    group_names_with_no_flags = get_group_names_with_no_flags(authorization_groups)
     if len(group_names_with_no_flags) > 0:
-        context["user"] = decode_and_check_jwt_token(token)
-        matched_groups = await get_user_groups_from_database(context["user"], group_names_with_no_flags)
+        authorization["user"] = get_username()
+        matched_groups = await get_user_groups(authorization["user"], group_names_with_no_flags)
 
         if len(matched_groups) > 0:
-            context["group"] = matched_groups[0]["group_name"]
+            authorization["group"] = matched_groups[0]["group_name"]
             logger.info(
                 {
-                    "message": f"{context['group']} group matched",
+                    "message": f"{authorization['group']} group matched",
                     "X-Request-ID": context.get("X-Request-ID")
                 }
             )
@@ -113,8 +130,8 @@ async def authorize_redirects(
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
 
     elif AUTHENTICATE_FLAG in authorization_groups:
-        context["user"] = decode_and_check_jwt_token(token)
-        context["group"] = AUTHENTICATE_FLAG
+        authorization["user"] = get_username()
+        authorization["group"] = AUTHENTICATE_FLAG
         logger.info(
             {
                 "message": f"{AUTHENTICATE_FLAG} flag matched",
@@ -122,10 +139,31 @@ async def authorize_redirects(
             }
         )
     elif NO_AUTHENTICATION_FLAG in authorization_groups:
-        context["group"] = NO_AUTHENTICATION_FLAG
+        authorization["group"] = NO_AUTHENTICATION_FLAG
         logger.info(
             {
                 "message": f"{NO_AUTHENTICATION_FLAG} flag matched",
                 "X-Request-ID": context.get("X-Request-ID")
             }
         )
+
+
+async def authorize_redirects(
+        request: Request,
+        api_name: str,
+        version: str,
+        endpoint: str,
+        token: Annotated[HTTPAuthorizationCredentials, Depends(BEARER_TOKEN)]
+) -> None:
+    context["api_name"] = api_name
+    context["version"] = version
+    await authorize_request(
+        context,
+        request.method,
+        api_name,
+        version,
+        f"/{endpoint}",
+        lambda: decode_and_check_jwt_token(token),
+        get_user_groups_from_database,
+    )
+    check_rate_limit(context)
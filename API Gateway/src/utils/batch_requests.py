@@ -0,0 +1,244 @@
+import re
+import json
+import asyncio
+from typing import Any, AsyncIterator, Callable, Awaitable, Dict, List, Optional, Tuple, Mapping
+from fastapi import Request, HTTPException, status
+from fastapi.responses import Response
+from fastapi.security import HTTPAuthorizationCredentials
+from pydantic import BaseModel, Field
+from starlette.datastructures import MutableHeaders
+from starlette_context import context
+from .authorization import (
+    authorize_request, decode_and_check_jwt_token, get_endpoint_authorization_config, get_group_names_with_no_flags
+)
+from .constants import BATCH_MAX_REQUESTS, BATCH_MAX_CONCURRENCY, DENY_ALL_ACCESS_FLAG
+from .database_and_client import get_user_groups_from_database
+from .fair_queuing import check_rate_limit
+from .redirect_requests import generate_url_for_redirect, add_forwarding_headers, forward_request
+from .splunk_logging import logger, log_exception
+
+
+SUB_REQUEST_PATH_PATTERN = re.compile(r"^/?(?P<api_name>[^/?]+)/api/(?P<version>[^/?]+)/(?P<endpoint>[^?]*)(\?(?P<query>.*))?$")
+SUB_REQUEST_RESERVED_HEADERS = {"authorization", "api-user"}
+
+
+class SubRequest(BaseModel):
+    id: Optional[str] = None
+    method: str
+    path: str
+    headers: Dict[str, str] = Field(default_factory=dict)
+    body: Any = None
+
+
+class BatchRequest(BaseModel):
+    requests: List[SubRequest]
+    concurrency: Optional[int] = None
+    stream: bool = False
+
+
+def parse_sub_request_path(path: str) -> Tuple[str, str, str, str]:
+    match = SUB_REQUEST_PATH_PATTERN.match(path)
+    if not match:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+
+    return match.group("api_name"), match.group("version"), match.group("endpoint"), match.group("query") or ""
+
+
+def collect_group_names(batch: BatchRequest) -> List[str]:
+    group_names = set()
+    for sub_request in batch.requests:
+        try:
+            api_name, version, endpoint, _ = parse_sub_request_path(sub_request.path)
+            authorization_config = get_endpoint_authorization_config(api_name, version, f"/{endpoint}")
+        except HTTPException:
+            continue
+
+        authorization_groups = authorization_config["methods"].get(sub_request.method.upper(), [])
+        if DENY_ALL_ACCESS_FLAG in authorization_groups:
+            continue
+
+        group_names.update(get_group_names_with_no_flags(authorization_groups))
+
+    return sorted(group_names)
+
+
+def create_username_getter(token: Optional[HTTPAuthorizationCredentials]) -> Callable[[], str]:
+    decoded = {}
+
+    def get_username() -> str:
+        if "status_code" in decoded:
+            raise HTTPException(status_code=decoded["status_code"])
+
+        if "username" not in decoded:
+            try:
+                decoded["username"] = decode_and_check_jwt_token(token)
+            except HTTPException as e:
+                decoded["status_code"] = e.status_code
+                raise
+            context["user"] = decoded["username"]
+
+        return decoded["username"]
+
+    return get_username
+
+
+def create_user_groups_getter(group_names: List[str]) -> Callable[[str, List[str]], Awaitable[List[Dict[str, str]]]]:
+    lookup = {}
+
+    async def get_user_groups(username: str, groups: List[str]) -> List[Dict[str, str]]:
+        if "task" not in lookup:
+            lookup["task"] = asyncio.ensure_future(get_user_groups_from_database(username, group_names))
+
+        matched_groups = await asyncio.shield(lookup["task"])
+        return [group for group in matched_groups if group["group_name"] in groups]
+
+    return get_user_groups
+
+
+def generate_sub_request_headers(
+        request: Request,
+        sub_request_headers: Mapping[str, str],
+        user: Optional[str]
+) -> MutableHeaders:
+    new_headers = request.headers.mutablecopy()
+    del new_headers["content-type"]
+    del new_headers["api-user"]
+
+    for name, value in sub_request_headers.items():
+        if name.lower() in SUB_REQUEST_RESERVED_HEADERS:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Sub-requests cannot set the {name} header"
+            )
+        new_headers[name] = value
+
+    return add_forwarding_headers(request, new_headers, user)
+
+
+def encode_sub_request_body(body: Any) -> Tuple[bytes, Optional[str]]:
+    if body is None:
+        return b"", None
+
+    if isinstance(body, str):
+        return body.encode(), None
+
+    return json.dumps(body).encode(), "application/json"
+
+
+def decode_sub_response_body(response: Response) -> Any:
+    if not response.body:
+        return None
+
+    if "json" in (response.media_type or ""):
+        try:
+            return json.loads(response.body)
+        except ValueError:
+            pass
+
+    return response.body.decode(errors="replace")
+
+
+async def execute_sub_request(
+        request: Request,
+        index: int,
+        sub_request: SubRequest,
+        get_username: Callable[[], str],
+        get_user_groups: Callable[[str, List[str]], Awaitable[List[Dict[str, str]]]],
+        semaphore: asyncio.Semaphore
+) -> Dict[str, Any]:
+    result = {"index": index}
+    if sub_request.id is not None:
+        result["id"] = sub_request.id
+
+    async with semaphore:
+        try:
+            method = sub_request.method.upper()
+            api_name, version, endpoint, query = parse_sub_request_path(sub_request.path)
+            authorization = {}
+            await authorize_request(
+                authorization,
+                method,
+                api_name,
+                version,
+                f"/{endpoint}",
+                get_username,
+                get_user_groups,
+            )
+            check_rate_limit(authorization)
+
+            data, content_type = encode_sub_request_body(sub_request.body)
+            headers = generate_sub_request_headers(request, sub_request.headers, authorization.get("user"))
+            if content_type and "content-type" not in headers:
+                headers["content-type"] = content_type
+
+            response = await forward_request(
+                authorization,
+                method,
+                generate_url_for_redirect(endpoint, query, authorization["url"]),
+                headers,
+                data,
+            )
+            result["status_code"] = response.status_code
+            result["headers"] = dict(response.headers)
+            result["body"] = decode_sub_response_body(response)
+        except HTTPException as e:
+            result["status_code"] = e.status_code
+            result["body"] = {"detail": e.detail}
+        except Exception as e:
+            log_exception("Internal Server Error", e)
+            result["status_code"] = status.HTTP_500_INTERNAL_SERVER_ERROR
+            result["body"] = {"detail": "Internal Server Error"}
+
+    return result
+
+
+def execute_batch(
+        request: Request,
+        batch: BatchRequest,
+        token: Optional[HTTPAuthorizationCredentials]
+) -> List[asyncio.Task]:
+    if len(batch.requests) == 0:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Batch contains no requests")
+
+    if len(batch.requests) > BATCH_MAX_REQUESTS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Batch contains more than {BATCH_MAX_REQUESTS} requests"
+        )
+
+    concurrency = max(1, min(batch.concurrency or BATCH_MAX_CONCURRENCY, BATCH_MAX_CONCURRENCY))
+    logger.info(
+        {
+            "message": f"Executing batch of {len(batch.requests)} requests with concurrency {concurrency}",
+            "X-Request-ID": context.get("X-Request-ID")
+        }
+    )
+
+    semaphore = asyncio.Semaphore(concurrency)
+    get_username = create_username_getter(token)
+    get_user_groups = create_user_groups_getter(collect_group_names(batch))
+
+    return [
+        asyncio.ensure_future(
+            execute_sub_request(request, index, sub_request, get_username, get_user_groups, semaphore)
+        )
+        for index, sub_request in enumerate(batch.requests)
+    ]
+
+
+async def gather_batch_results(tasks: List[asyncio.Task]) -> List[Dict[str, Any]]:
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+
+
+async def stream_batch_results(tasks: List[asyncio.Task]) -> AsyncIterator[bytes]:
+    try:
+        for completed in asyncio.as_completed(tasks):
+            yield json.dumps(await completed).encode() + b"\n"
+    finally:
+        for task in tasks:
+            task.cancel()
@@ -1,4 +1,6 @@
 import os
+import json
+import math
 import traceback
 import fnmatch
 import yaml
@@ -19,6 +21,25 @@ DB_NAME = "auth_db"
 DB_HOST = "postgresql.database-namespace.svc.cluster.local"
 DB_PORT = 5432
 ENDPOINT_RULES = {}
+PROXY_METHODS = ["GET", "POST", "PUT", "DELETE", "PATCH", "HEAD", "OPTIONS"]
+FAST_PATH_ROUTER_ENABLED = os.getenv("FAST_PATH_ROUTER_ENABLED", "true").lower() == "true"
+DEADLINE_HEADER = "X-Request-Timeout-Ms"
+DEFAULT_REQUEST_TIMEOUT = float(os.getenv("DEFAULT_REQUEST_TIMEOUT", "30"))
+MAX_REQUEST_TIMEOUT = float(os.getenv("MAX_REQUEST_TIMEOUT", "60"))
+DEFAULT_UPSTREAM_TIMEOUT = float(os.getenv("DEFAULT_UPSTREAM_TIMEOUT", "30"))
+STREAM_IDLE_TIMEOUT = float(os.getenv("STREAM_IDLE_TIMEOUT", "60"))
+MAX_LONG_LIVED_CONNECTIONS_PER_UPSTREAM = int(os.getenv("MAX_LONG_LIVED_CONNECTIONS_PER_UPSTREAM", "500"))
+UPSTREAM_CONCURRENCY = int(os.getenv("UPSTREAM_CONCURRENCY", "100"))
+GROUP_WEIGHTS = {"admin": 8, "developer": 4, AUTHENTICATE_FLAG: 2, NO_AUTHENTICATION_FLAG: 1}
+DEFAULT_GROUP_WEIGHT = 2
+RATE_LIMIT_PER_SECOND = float(os.getenv("RATE_LIMIT_PER_SECOND", "0"))
+RATE_LIMIT_BURST = float(os.getenv("RATE_LIMIT_BURST", "100"))
+RATE_LIMIT_MAX_TRACKED_USERS = 10000
+WARMUP_TIMEOUT = float(os.getenv("WARMUP_TIMEOUT", "5"))
+WARMUP_CONNECTIONS_PER_UPSTREAM = int(os.getenv("WARMUP_CONNECTIONS_PER_UPSTREAM", "2"))
+DRAINING_FILE = os.getenv("DRAINING_FILE", "/tmp/gateway-draining")
+BATCH_MAX_REQUESTS = 50
+BATCH_MAX_CONCURRENCY = 10
 
 
 def read_data_from_yaml_file(root: str, file: str) -> Dict[str, Any]:
@@ -51,6 +72,7 @@ def populate_endpoint_rules(onboarding_data: Dict[str, Any]):
     version = onboarding_data.get("version")
     port = onboarding_data.get("port")
     endpoints = onboarding_data.get("endpoints")
+    api_timeout = onboarding_data.get("timeout")
 
     url = f"http://{api_name}.{namespace}.svc.cluster.local:{port}/"
 
@@ -62,22 +84,57 @@ def populate_endpoint_rules(onboarding_data: Dict[str, Any]):
 
     for rule in endpoints:
         ((endpoint, permissions),) = rule.items()
-        permissions = {
+        timeout = permissions.get("timeout", api_timeout)
+        methods = {
             method.upper(): [options] if not isinstance(options, list) else options
             for method, options in permissions.items()
+            if method != "timeout"
         }
 
         endpoint = fnmatch.translate(endpoint)
 
+        # Rule metadata is kept apart from the permissions so it can never be looked up as a method
         api_endpoint = {
             endpoint: {
                 "url": url,
+                "timeout": float(timeout) if timeout is not None else DEFAULT_UPSTREAM_TIMEOUT,
+                "methods": methods,
             }
         }
-        api_endpoint[endpoint].update(permissions)
         ENDPOINT_RULES[api_name][version].append(api_endpoint)
 
 
+def read_group_weight_overrides(overrides: str) -> Dict[str, float]:
+    try:
+        group_weights = json.loads(overrides)
+    except ValueError:
+        group_weights = None
+
+    if not isinstance(group_weights, dict):
+        logger.error(
+            {
+                "message": f"GROUP_WEIGHTS must be a JSON object, ignoring {overrides!r}",
+                "process": "configuration"
+            }
+        )
+        return {}
+
+    valid_group_weights = {}
+    for group, weight in group_weights.items():
+        if isinstance(weight, bool) or not isinstance(weight, (int, float)) or not math.isfinite(weight) or weight <= 0:
+            logger.error(
+                {
+                    "message": f"Weight of group {group} must be a positive number, ignoring {weight!r}",
+                    "process": "configuration"
+                }
+            )
+            continue
+
+        valid_group_weights[group] = float(weight)
+
+    return valid_group_weights
+
+
 def parse_onboarding_config_and_populate_data_structures():
     for root, _, files in os.walk("./onboarding-config"):
         for file in files:
@@ -100,3 +157,4 @@ def parse_onboarding_config_and_populate_data_structures():
 
 
 parse_onboarding_config_and_populate_data_structures()
+GROUP_WEIGHTS.update(read_group_weight_overrides(os.getenv("GROUP_WEIGHTS", "{}")))
@@ -1,32 +1,54 @@
+import time
 import asyncio
 import traceback
-from aiohttp import ClientSession
+from aiohttp import ClientSession, ClientTimeout, TCPConnector
 from typing import List, Dict, Union, Optional
 from contextlib import asynccontextmanager
 from asyncpg import create_pool, Pool
 from fastapi import FastAPI, HTTPException, status
 from starlette_context import context
 from .splunk_logging import logger
-from .constants import DB_USER, DB_PASSWORD, DB_HOST, DB_NAME, DB_PORT
+from .constants import (
+    DB_USER, DB_PASSWORD, DB_HOST, DB_NAME, DB_PORT, DEFAULT_UPSTREAM_TIMEOUT, UPSTREAM_CONCURRENCY, ENDPOINT_RULES,
+    PASSWORD_CONTEXT, WARMUP_TIMEOUT, WARMUP_CONNECTIONS_PER_UPSTREAM
+)
+from .deadline import check_deadline, limit_timeout, get_remaining_time
+from .health import set_ready
 
 
 database_pool: Pool = None
 client_session: ClientSession = None
+streaming_client_session: ClientSession = None
 
 
 async def get_client_session() -> ClientSession:
     global client_session
 
+    # Sized like the upstream fair queue, so requests wait in the queue and never inside the connector
     if client_session is None or client_session.closed:
-        client_session = ClientSession()
+        client_session = ClientSession(
+            connector=TCPConnector(limit=UPSTREAM_CONCURRENCY),
+            timeout=ClientTimeout(total=DEFAULT_UPSTREAM_TIMEOUT)
+        )
 
     return client_session
 
 
+async def get_streaming_client_session() -> ClientSession:
+    global streaming_client_session
+
+    # Long-lived connections are capped per upstream instead, so they never starve the shared connector
+    if streaming_client_session is None or streaming_client_session.closed:
+        streaming_client_session = ClientSession(connector=TCPConnector(limit=0), timeout=ClientTimeout(total=None))
+
+    return streaming_client_session
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    global database_pool, client_session
+    global database_pool, client_session, streaming_client_session
     await get_client_session()
+    await get_streaming_client_session()
     database_pool = await create_pool(
         user=DB_USER,
         password=DB_PASSWORD,
@@ -36,9 +58,92 @@ async def lifespan(app: FastAPI):
         min_size=1,
         max_size=5
     )
+    # Warm-up runs once uvicorn is listening, /readyz keeps the pod out of rotation until it is done
+    warm_up_task = asyncio.ensure_future(warm_up())
     yield
+    # uvicorn only gets here after in-flight requests finished or --timeout-graceful-shutdown ran out
+    warm_up_task.cancel()
+    await asyncio.gather(warm_up_task, return_exceptions=True)
     await database_pool.close()
     await client_session.close()
+    await streaming_client_session.close()
+
+
+def log_warm_up_failure(message: str, exc: Exception) -> None:
+    logger.error(
+        {
+            "message": message,
+            "process": "lifespan",
+            "exception": "".join(traceback.format_exception(
+                type(exc), value=exc, tb=exc.__traceback__
+            ))
+        }
+    )
+
+
+async def warm_database_pool() -> None:
+    async def open_connection():
+        async with database_pool.acquire(timeout=WARMUP_TIMEOUT) as connection:
+            await connection.fetchval("SELECT 1", timeout=WARMUP_TIMEOUT)
+
+    # Concurrent acquires make the pool open every connection up to max_size, not just min_size
+    results = await asyncio.gather(
+        *(open_connection() for _ in range(database_pool.get_max_size())), return_exceptions=True
+    )
+    for result in results:
+        if isinstance(result, Exception):
+            log_warm_up_failure("Failed to open a database connection during warm-up", result)
+
+
+async def warm_upstream_connections() -> None:
+    upstreams = {
+        authorization_config["url"]
+        for versions in ENDPOINT_RULES.values()
+        for endpoint_rules in versions.values()
+        for endpoint_rule in endpoint_rules
+        for authorization_config in endpoint_rule.values()
+    }
+
+    async def open_connection(url: str):
+        async with client_session.request(method="HEAD", url=url, timeout=ClientTimeout(total=WARMUP_TIMEOUT)):
+            pass
+
+    results = await asyncio.gather(
+        *(open_connection(url) for url in upstreams for _ in range(WARMUP_CONNECTIONS_PER_UPSTREAM)),
+        return_exceptions=True
+    )
+    for result in results:
+        if isinstance(result, Exception):
+            log_warm_up_failure("Failed to open an upstream connection during warm-up", result)
+
+
+async def warm_up() -> None:
+    start_time = time.time()
+    results = await asyncio.gather(
+        # Loads the bcrypt backend, which passlib otherwise does lazily on the first /login
+        asyncio.to_thread(PASSWORD_CONTEXT.dummy_verify),
+        warm_database_pool(),
+        warm_upstream_connections(),
+        return_exceptions=True
+    )
+    for result in results:
+        if isinstance(result, Exception):
+            log_warm_up_failure("Warm-up step failed", result)
+    logger.info(
+        {
+            "message": f"Warm-up finished in {(time.time() - start_time) * 1000:.0f}ms",
+            "process": "lifespan"
+        }
+    )
+    set_ready(True)
+
+
+async def run_database_query(query: str, *args, fetchval: bool = False) -> Union[Optional[str], List[Dict[str, str]]]:
+    async with database_pool.acquire() as connection:
+        if fetchval:
+            return await connection.fetchval(query, *args)
+
+        return await connection.fetch(query, *args)
 
 
 async def retry_database_query(
@@ -48,23 +153,19 @@ async def retry_database_query(
         fetchval: bool = False,
         exc_info: str = "Failed to query database"
 ) -> Union[Optional[str], List[Dict[str, str]]]:
-    global database_pool
     for attempt in range(retry_limit):
+        timeout = limit_timeout(None, "database query")
         try:
-            async with database_pool.acquire() as connection:
-                if fetchval:
-                    result = await connection.fetchval(query, *args)
-                else:
-                    result = await connection.fetch(query, *args)
-
-                logger.info(
-                    {
-                        "message": f"Successfully queried database",
-                        "X-Request-ID": context.get("X-Request-ID")
-                    }
-                )
-
-                return result
+            result = await asyncio.wait_for(run_database_query(query, *args, fetchval=fetchval), timeout)
+
+            logger.info(
+                {
+                    "message": f"Successfully queried database",
+                    "X-Request-ID": context.get("X-Request-ID")
+                }
+            )
+
+            return result
         except Exception as exc:
             logger.error(
                 {
@@ -75,9 +176,24 @@ async def retry_database_query(
                     "X-Request-ID": context.get("X-Request-ID")
                 }
             )
-            wait_time = 2 ** attempt
-            await asyncio.sleep(wait_time)
 
+        if attempt == retry_limit - 1:
+            break
+
+        wait_time = 2 ** attempt
+        remaining_time = get_remaining_time()
+        if remaining_time is not None and remaining_time <= wait_time:
+            logger.error(
+                {
+                    "message": f"{exc_info}: request deadline exceeded before retrying",
+                    "X-Request-ID": context.get("X-Request-ID")
+                }
+            )
+            raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT)
+
+        await asyncio.sleep(wait_time)
+
+    check_deadline("reporting the database error")
     logger.error(
         {
             "message": f"{exc_info} after {retry_limit} retries",
@@ -0,0 +1,71 @@
+import math
+import time
+from typing import Mapping, Optional
+from fastapi import HTTPException, status
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Receive, Scope, Send
+from starlette_context import context
+from .constants import DEADLINE_HEADER, DEFAULT_REQUEST_TIMEOUT, MAX_REQUEST_TIMEOUT
+from .splunk_logging import logger
+
+
+def get_request_timeout(headers: Mapping[str, str]) -> float:
+    try:
+        timeout = float(headers.get(DEADLINE_HEADER)) / 1000
+    except (TypeError, ValueError):
+        return DEFAULT_REQUEST_TIMEOUT
+
+    if not math.isfinite(timeout):
+        return DEFAULT_REQUEST_TIMEOUT
+
+    return min(timeout, MAX_REQUEST_TIMEOUT)
+
+
+def start_request_deadline(headers: Mapping[str, str]) -> None:
+    context["deadline"] = time.time() + get_request_timeout(headers)
+
+
+def get_remaining_time() -> Optional[float]:
+    deadline = context.get("deadline")
+    if deadline is None:
+        return None
+
+    return deadline - time.time()
+
+
+def check_deadline(phase: str) -> Optional[float]:
+    remaining_time = get_remaining_time()
+
+    if remaining_time is not None and remaining_time <= 0:
+        logger.error(
+            {
+                "message": f"Request deadline exceeded before {phase}",
+                "X-Request-ID": context.get("X-Request-ID")
+            }
+        )
+        raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT)
+
+    return remaining_time
+
+
+def limit_timeout(timeout: Optional[float], phase: str) -> Optional[float]:
+    remaining_time = check_deadline(phase)
+
+    if remaining_time is None:
+        return timeout
+
+    if timeout is None:
+        return remaining_time
+
+    return min(timeout, remaining_time)
+
+
+class DeadlineMiddleware:
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http":
+            start_request_deadline(Headers(scope=scope))
+
+        await self.app(scope, receive, send)
@@ -0,0 +1,140 @@
+import math
+import time
+import heapq
+import asyncio
+import itertools
+from typing import Any, AsyncIterator, Dict, Hashable, List, MutableMapping, Optional, Tuple
+from contextlib import asynccontextmanager
+from fastapi import HTTPException, status
+from starlette_context import context
+from .constants import (
+    GROUP_WEIGHTS, DEFAULT_GROUP_WEIGHT, NO_AUTHENTICATION_FLAG, UPSTREAM_CONCURRENCY,
+    RATE_LIMIT_PER_SECOND, RATE_LIMIT_BURST, RATE_LIMIT_MAX_TRACKED_USERS
+)
+from .deadline import limit_timeout
+from .splunk_logging import logger
+
+
+RATE_LIMIT_BUCKETS: Dict[str, Tuple[float, float]] = {}
+
+
+# Start-time fair queuing: once upstream slots run out, waiting requests are served in order of their
+# flow's virtual start tag, so each flow gets slots in proportion to its weight however much it queues
+class FairQueue:
+    def __init__(self, capacity: int) -> None:
+        self.capacity = capacity
+        self.in_flight = 0
+        self.virtual_time = 0.0
+        self.finish_tags: Dict[Hashable, float] = {}
+        self.waiting: List[Tuple[float, int, asyncio.Future]] = []
+        self.sequence = itertools.count()
+
+    async def acquire(self, flow: Hashable, weight: float, timeout: Optional[float] = None) -> None:
+        if self.in_flight < self.capacity and not self.waiting:
+            self.in_flight += 1
+            return
+
+        start_tag = max(self.virtual_time, self.finish_tags.get(flow, self.virtual_time))
+        self.finish_tags[flow] = start_tag + 1 / weight
+        waiter = asyncio.get_running_loop().create_future()
+        heapq.heappush(self.waiting, (start_tag, next(self.sequence), waiter))
+
+        try:
+            await asyncio.wait_for(waiter, timeout)
+        except BaseException:
+            # The slot was handed over just as the wait was abandoned, pass it on
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+
+    def release(self) -> None:
+        while self.waiting:
+            start_tag, _, waiter = heapq.heappop(self.waiting)
+            if not waiter.done():
+                self.virtual_time = start_tag
+                waiter.set_result(None)
+                break
+        else:
+            self.in_flight -= 1
+
+        # Flows only compete while requests are waiting, so their history is dropped once the queue drains
+        if not self.waiting:
+            self.finish_tags.clear()
+
+
+UPSTREAM_QUEUE = FairQueue(UPSTREAM_CONCURRENCY)
+
+
+def get_flow(state: MutableMapping[str, Any]) -> Tuple[str, str]:
+    if state.get("user"):
+        return "user", state["user"]
+
+    return "group", state.get("group") or NO_AUTHENTICATION_FLAG
+
+
+def get_flow_weight(state: MutableMapping[str, Any]) -> float:
+    return GROUP_WEIGHTS.get(state.get("group") or NO_AUTHENTICATION_FLAG, DEFAULT_GROUP_WEIGHT)
+
+
+async def wait_for_upstream_slot(state: MutableMapping[str, Any]) -> None:
+    queued_at = time.time()
+    try:
+        await UPSTREAM_QUEUE.acquire(get_flow(state), get_flow_weight(state), limit_timeout(None, "upstream queue"))
+    except asyncio.TimeoutError:
+        logger.error(
+            {
+                "message": "Request deadline exceeded while queued for an upstream connection",
+                "X-Request-ID": context.get("X-Request-ID")
+            }
+        )
+        raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT)
+
+    state["upstream_queue_time"] = time.time() - queued_at
+
+
+def release_upstream_slot() -> None:
+    UPSTREAM_QUEUE.release()
+
+
+@asynccontextmanager
+async def acquire_upstream_slot(state: MutableMapping[str, Any]) -> AsyncIterator[None]:
+    await wait_for_upstream_slot(state)
+    try:
+        yield
+    finally:
+        release_upstream_slot()
+
+
+def prune_rate_limit_buckets(now: float) -> None:
+    for key, (tokens, updated_at) in list(RATE_LIMIT_BUCKETS.items()):
+        if tokens + (now - updated_at) * RATE_LIMIT_PER_SECOND >= RATE_LIMIT_BURST:
+            del RATE_LIMIT_BUCKETS[key]
+
+
+def check_rate_limit(state: MutableMapping[str, Any]) -> None:
+    # Anonymous callers cannot be told apart behind an ingress, so only authenticated users are limited
+    if RATE_LIMIT_PER_SECOND <= 0 or not state.get("user"):
+        return
+
+    key = state["user"]
+    now = time.monotonic()
+    if key not in RATE_LIMIT_BUCKETS and len(RATE_LIMIT_BUCKETS) >= RATE_LIMIT_MAX_TRACKED_USERS:
+        prune_rate_limit_buckets(now)
+
+    tokens, updated_at = RATE_LIMIT_BUCKETS.get(key, (RATE_LIMIT_BURST, now))
+    tokens = min(RATE_LIMIT_BURST, tokens + (now - updated_at) * RATE_LIMIT_PER_SECOND)
+
+    if tokens < 1:
+        RATE_LIMIT_BUCKETS[key] = (tokens, now)
+        logger.info(
+            {
+                "message": f"Rate limit of {RATE_LIMIT_PER_SECOND} requests/s exceeded by {key}",
+                "X-Request-ID": context.get("X-Request-ID")
+            }
+        )
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            headers={"Retry-After": str(math.ceil((1 - tokens) / RATE_LIMIT_PER_SECOND))}
+        )
+
+    RATE_LIMIT_BUCKETS[key] = (tokens - 1, now)
@@ -0,0 +1,89 @@
+import re
+import time
+from fastapi import HTTPException
+from fastapi.requests import Request
+from fastapi.responses import Response, JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from starlette_context import context, request_cycle_context
+from starlette_context.errors import MiddleWareValidationError
+from starlette_context.plugins import RequestIdPlugin
+from .authorization import authorize_request, decode_and_check_jwt_token, get_bearer_token
+from .constants import PROXY_METHODS
+from .database_and_client import get_user_groups_from_database
+from .deadline import start_request_deadline
+from .fair_queuing import check_rate_limit
+from .redirect_requests import generate_url_for_redirect, generate_headers, forward_request
+from .splunk_logging import log_request, error_response
+from .streaming import accepts_event_stream, forward_event_stream
+
+
+PROXY_PATH_PATTERN = re.compile(r"^/(?P<api_name>[^/]+)/api/(?P<version>[^/]+)/(?P<endpoint>.*)$")
+
+
+async def proxy_request(request: Request, api_name: str, version: str, endpoint: str) -> Response:
+    context["api_name"] = api_name
+    context["version"] = version
+    await authorize_request(
+        context,
+        request.method,
+        api_name,
+        version,
+        f"/{endpoint}",
+        lambda: decode_and_check_jwt_token(get_bearer_token(request)),
+        get_user_groups_from_database,
+    )
+    check_rate_limit(context)
+
+    forward = forward_event_stream if accepts_event_stream(request) else forward_request
+    return await forward(
+        context,
+        request.method,
+        generate_url_for_redirect(endpoint, request.query_params),
+        generate_headers(request),
+        await request.body(),
+    )
+
+
+# Serves proxied traffic without FastAPI routing, dependency resolution or BaseHTTPMiddleware,
+# while keeping the request context, X-Request-ID header and access log of the regular middleware stack
+class FastPathRouter:
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+        self.request_id_plugin = RequestIdPlugin()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        # Other methods fall through so FastAPI answers them with the same 405 as the regular route
+        match = PROXY_PATH_PATTERN.match(scope["path"])
+        if not match or scope["method"] not in PROXY_METHODS:
+            await self.app(scope, receive, send)
+            return
+
+        scope["path_params"] = match.groupdict()
+        request = Request(scope, receive)
+
+        try:
+            request_id = await self.request_id_plugin.process_request(request)
+        except MiddleWareValidationError as e:
+            await (e.error_response or Response(status_code=400))(scope, receive, send)
+            return
+
+        async def send_wrapper(message: Message) -> None:
+            await self.request_id_plugin.enrich_response(message)
+            await send(message)
+
+        with request_cycle_context({self.request_id_plugin.key: request_id}):
+            context["gateway_start_time"] = time.time()
+            start_request_deadline(request.headers)
+            try:
+                response = await proxy_request(request, **scope["path_params"])
+            except HTTPException as e:
+                response = JSONResponse(status_code=e.status_code, content={"detail": e.detail}, headers=e.headers)
+            except Exception as e:
+                response = await error_response(request, e)
+
+            log_request(request, response)
+            await response(scope, receive, send_wrapper)
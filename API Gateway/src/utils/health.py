@@ -0,0 +1,45 @@
+import os
+from fastapi import status
+from fastapi.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+from .constants import DRAINING_FILE
+from .splunk_logging import logger
+
+
+GATEWAY_STATE = {"ready": False}
+
+
+def set_ready(ready: bool) -> None:
+    GATEWAY_STATE["ready"] = ready
+    logger.info(
+        {
+            "message": "Gateway is ready to receive traffic" if ready else "Gateway is not ready to receive traffic",
+            "process": "lifespan"
+        }
+    )
+
+
+def is_ready() -> bool:
+    # The preStop hook creates the draining file, so the pod leaves rotation while uvicorn still serves
+    return GATEWAY_STATE["ready"] and not os.path.exists(DRAINING_FILE)
+
+
+# Outermost middleware, so probes skip the request context and access log
+class HealthCheckMiddleware:
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http" and scope["path"] == "/healthz":
+            await JSONResponse(status_code=status.HTTP_200_OK, content={"status": "ok"})(scope, receive, send)
+            return
+
+        if scope["type"] == "http" and scope["path"] == "/readyz":
+            if is_ready():
+                response = JSONResponse(status_code=status.HTTP_200_OK, content={"status": "ready"})
+            else:
+                response = JSONResponse(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, content={"status": "not ready"})
+            await response(scope, receive, send)
+            return
+
+        await self.app(scope, receive, send)
@@ -1,10 +1,20 @@
-from fastapi import Request
+import time
+import asyncio
+from typing import Any, MutableMapping, Optional
+from aiohttp import ClientTimeout, ClientPayloadError, ClientResponseError, ClientConnectorError
+from fastapi import Request, HTTPException, status
+from fastapi.responses import Response
 from starlette.datastructures import MutableHeaders, QueryParams
 from starlette_context import context
+from .constants import DEADLINE_HEADER, DEFAULT_UPSTREAM_TIMEOUT
+from .database_and_client import get_client_session
+from .deadline import limit_timeout, get_remaining_time
+from .fair_queuing import acquire_upstream_slot
+from .splunk_logging import log_exception
 
 
-def generate_url_for_redirect(endpoint: str, query_params: QueryParams = None) -> str:
-    url = f"{context.get('url')}{endpoint}"
+def generate_url_for_redirect(endpoint: str, query_params: QueryParams = None, base_url: Optional[str] = None) -> str:
+    url = f"{base_url or context.get('url')}{endpoint}"
 
     if query_params:
         url += f"?{query_params}"
@@ -13,10 +23,12 @@ def generate_url_for_redirect(endpoint: str, query_params: QueryParams = None) -
 
 
 def generate_headers(request: Request) -> MutableHeaders:
-    new_headers = request.headers.mutablecopy()
+    return add_forwarding_headers(request, request.headers.mutablecopy(), context.get("user"))
 
-    if context.get("user"):
-        new_headers["API-User"] = context.get("user")
+
+def add_forwarding_headers(request: Request, new_headers: MutableHeaders, user: Optional[str]) -> MutableHeaders:
+    if user:
+        new_headers["API-User"] = user
 
     new_headers["X-Request-ID"] = context.get("X-Request-ID")
     new_headers["X-Forwarded-Proto"] = new_headers.get("X-Forwarded-Proto", "http")
@@ -34,3 +46,53 @@ def generate_headers(request: Request) -> MutableHeaders:
         del new_headers[header]
 
     return new_headers
+
+
+def get_upstream_error(exc: Exception) -> HTTPException:
+    if isinstance(exc, (ClientPayloadError, ClientConnectorError)):
+        log_exception("Bad Gateway", exc)
+        return HTTPException(status_code=status.HTTP_502_BAD_GATEWAY)
+    if isinstance(exc, ClientResponseError):
+        if exc.status == 503:
+            log_exception("Service Unavailable", exc)
+            return HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE)
+        log_exception("Bad Gateway", exc)
+        return HTTPException(status_code=status.HTTP_502_BAD_GATEWAY)
+    if isinstance(exc, asyncio.TimeoutError):
+        log_exception("Gateway Timeout", exc)
+        return HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT)
+    log_exception("Internal Server Error", exc)
+    return HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+async def forward_request(
+        state: MutableMapping[str, Any],
+        method: str,
+        url: str,
+        headers: MutableMapping[str, str],
+        data: bytes
+) -> Response:
+    async with acquire_upstream_slot(state):
+        timeout = limit_timeout(state.get("timeout") or DEFAULT_UPSTREAM_TIMEOUT, "upstream request")
+        if get_remaining_time() is not None:
+            headers[DEADLINE_HEADER] = str(int(timeout * 1000))
+
+        try:
+            state["backend_start_time"] = time.time()
+            async with (await get_client_session()).request(
+                    method=method,
+                    url=url,
+                    headers=headers,
+                    data=data,
+                    timeout=ClientTimeout(total=timeout),
+            ) as response:
+                content = await response.read()
+                state["backend_end_time"] = time.time()
+                return Response(
+                    content=content,
+                    status_code=response.status,
+                    headers=response.headers,
+                    media_type=response.headers.get("content-type"),
+                )
+        except Exception as e:
+            raise get_upstream_error(e)
@@ -60,7 +60,8 @@ async def error_response(request: Request, exc: Exception) -> Response:
 
 class LoggingMiddleware(BaseHTTPMiddleware):
 
-    def format_log(self, request: Request, response: Response):
+    @staticmethod
+    def format_log(request: Request, response: Response):
         event = {
             "timestamp": datetime.datetime.utcnow().isoformat() + "Z",
             "X-Request-ID": context.get("X-Request-ID"),
@@ -84,6 +85,9 @@ class LoggingMiddleware(BaseHTTPMiddleware):
         if context.get("backend_end_time") and context.get("backend_start_time"):
             event["backend_api_response_time_ms"] = (context.get("backend_end_time") - context.get("backend_start_time")) * 1000
 
+        if context.get("upstream_queue_time") is not None:
+            event["upstream_queue_time_ms"] = context.get("upstream_queue_time") * 1000
+
         if request.path_params.get("api_name"):
             event["request"]["api_name"] = request.path_params.get("api_name")
 
@@ -115,10 +119,14 @@ class LoggingMiddleware(BaseHTTPMiddleware):
         context["gateway_start_time"] = time.time()
         response = await call_next(request)
 
-        event = self.format_log(request, response)
-        logger.log(
-            level=logging.INFO if response.status_code < 400 else logging.ERROR,
-            msg=event
-        )
+        log_request(request, response)
 
         return response
+
+
+def log_request(request: Request, response: Response):
+    event = LoggingMiddleware.format_log(request, response)
+    logger.log(
+        level=logging.INFO if response.status_code < 400 else logging.ERROR,
+        msg=event
+    )
@@ -0,0 +1,294 @@
+import time
+import asyncio
+from typing import Any, AsyncIterator, Dict, MutableMapping
+from aiohttp import ClientResponse, ClientTimeout, ClientWebSocketResponse, WSMsgType
+from fastapi import HTTPException, WebSocket, status
+from fastapi.requests import Request
+from fastapi.responses import Response, StreamingResponse
+from starlette.websockets import WebSocketDisconnect
+from starlette_context import context
+from .authorization import authorize_request, decode_and_check_jwt_token, get_bearer_token
+from .constants import (
+    DEADLINE_HEADER, DEFAULT_UPSTREAM_TIMEOUT, STREAM_IDLE_TIMEOUT, MAX_LONG_LIVED_CONNECTIONS_PER_UPSTREAM
+)
+from .database_and_client import get_streaming_client_session, get_user_groups_from_database
+from .deadline import limit_timeout, get_remaining_time, start_request_deadline
+from .fair_queuing import check_rate_limit, wait_for_upstream_slot, release_upstream_slot
+from .redirect_requests import generate_headers, get_upstream_error
+from .splunk_logging import logger, log_exception
+
+
+EVENT_STREAM_MEDIA_TYPE = "text/event-stream"
+STREAMING_HEADERS_TO_DELETE = ["connection", "content-length", "keep-alive", "transfer-encoding"]
+WEBSOCKET_HEADERS_TO_DELETE = [
+    "sec-websocket-extensions",
+    "sec-websocket-key",
+    "sec-websocket-protocol",
+    "sec-websocket-version",
+    "upgrade",
+]
+UNSENDABLE_CLOSE_CODES = {
+    status.WS_1005_NO_STATUS_RCVD, status.WS_1006_ABNORMAL_CLOSURE, status.WS_1015_TLS_HANDSHAKE
+}
+LONG_LIVED_CONNECTIONS: Dict[str, int] = {}
+
+
+def accepts_event_stream(request: Request) -> bool:
+    return EVENT_STREAM_MEDIA_TYPE in request.headers.get("Accept", "")
+
+
+def acquire_long_lived_connection(upstream: str) -> None:
+    if LONG_LIVED_CONNECTIONS.get(upstream, 0) >= MAX_LONG_LIVED_CONNECTIONS_PER_UPSTREAM:
+        logger.error(
+            {
+                "message": f"Long-lived connection limit of {MAX_LONG_LIVED_CONNECTIONS_PER_UPSTREAM} reached for {upstream}",
+                "X-Request-ID": context.get("X-Request-ID")
+            }
+        )
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+    LONG_LIVED_CONNECTIONS[upstream] = LONG_LIVED_CONNECTIONS.get(upstream, 0) + 1
+
+
+def release_long_lived_connection(upstream: str) -> None:
+    LONG_LIVED_CONNECTIONS[upstream] -= 1
+    if LONG_LIVED_CONNECTIONS[upstream] <= 0:
+        del LONG_LIVED_CONNECTIONS[upstream]
+
+
+async def relay_event_stream(response: ClientResponse, upstream: str) -> AsyncIterator[bytes]:
+    try:
+        async for chunk in response.content.iter_any():
+            yield chunk
+    except asyncio.TimeoutError:
+        logger.info(
+            {
+                "message": f"Event stream idle for {STREAM_IDLE_TIMEOUT}s, closing",
+                "X-Request-ID": context.get("X-Request-ID")
+            }
+        )
+    except Exception as e:
+        log_exception("Event stream relay failed", e)
+    finally:
+        response.release()
+        release_long_lived_connection(upstream)
+
+
+async def forward_event_stream(
+        state: MutableMapping[str, Any],
+        method: str,
+        url: str,
+        headers: MutableMapping[str, str],
+        data: bytes
+) -> Response:
+    upstream = state["url"]
+    acquire_long_lived_connection(upstream)
+
+    # The Accept header is client controlled, so the request is queued like any other
+    # until the upstream confirms it is an event stream
+    try:
+        await wait_for_upstream_slot(state)
+    except HTTPException:
+        release_long_lived_connection(upstream)
+        raise
+
+    try:
+        timeout = limit_timeout(state.get("timeout") or DEFAULT_UPSTREAM_TIMEOUT, "upstream request")
+    except HTTPException:
+        release_upstream_slot()
+        release_long_lived_connection(upstream)
+        raise
+
+    if get_remaining_time() is not None:
+        headers[DEADLINE_HEADER] = str(int(timeout * 1000))
+
+    try:
+        state["backend_start_time"] = time.time()
+        response = await asyncio.wait_for(
+            (await get_streaming_client_session()).request(
+                method=method,
+                url=url,
+                headers=headers,
+                data=data,
+                timeout=ClientTimeout(total=None, sock_read=STREAM_IDLE_TIMEOUT),
+            ),
+            timeout
+        )
+    except Exception as e:
+        release_upstream_slot()
+        release_long_lived_connection(upstream)
+        raise get_upstream_error(e)
+
+    if EVENT_STREAM_MEDIA_TYPE not in response.headers.get("content-type", ""):
+        # sock_read only bounds idle time, the rule timeout and deadline still cover the whole reply
+        read_timeout = max(timeout - (time.time() - state["backend_start_time"]), 0)
+        try:
+            content = await asyncio.wait_for(response.read(), read_timeout)
+        except Exception as e:
+            raise get_upstream_error(e)
+        finally:
+            response.release()
+            release_upstream_slot()
+            release_long_lived_connection(upstream)
+
+        state["backend_end_time"] = time.time()
+        return Response(
+            content=content,
+            status_code=response.status,
+            headers=response.headers,
+            media_type=response.headers.get("content-type"),
+        )
+
+    # From here on the stream is bounded by the long-lived connection cap instead
+    release_upstream_slot()
+    state["backend_end_time"] = time.time()
+    response_headers = {
+        name: value for name, value in response.headers.items() if name.lower() not in STREAMING_HEADERS_TO_DELETE
+    }
+    return StreamingResponse(
+        relay_event_stream(response, upstream),
+        status_code=response.status,
+        headers=response_headers,
+        media_type=response.headers.get("content-type"),
+    )
+
+
+async def relay_client_frames(websocket: WebSocket, upstream: ClientWebSocketResponse, activity: Dict[str, float]):
+    while True:
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            return
+
+        activity["last"] = time.monotonic()
+        if message.get("text") is not None:
+            await upstream.send_str(message["text"])
+        elif message.get("bytes") is not None:
+            await upstream.send_bytes(message["bytes"])
+
+
+async def relay_upstream_frames(websocket: WebSocket, upstream: ClientWebSocketResponse, activity: Dict[str, float]):
+    while True:
+        message = await upstream.receive()
+        if message.type == WSMsgType.TEXT:
+            activity["last"] = time.monotonic()
+            await websocket.send_text(message.data)
+        elif message.type == WSMsgType.BINARY:
+            activity["last"] = time.monotonic()
+            await websocket.send_bytes(message.data)
+        elif message.type in (WSMsgType.CLOSE, WSMsgType.CLOSING, WSMsgType.CLOSED, WSMsgType.ERROR):
+            return
+
+
+async def watch_idle_connection(activity: Dict[str, float], idle_timeout: float):
+    while True:
+        idle_for = time.monotonic() - activity["last"]
+        if idle_for >= idle_timeout:
+            logger.info(
+                {
+                    "message": f"WebSocket idle for {idle_timeout}s, closing",
+                    "X-Request-ID": context.get("X-Request-ID")
+                }
+            )
+            return
+        await asyncio.sleep(idle_timeout - idle_for)
+
+
+async def relay_websocket_frames(
+        websocket: WebSocket,
+        upstream: ClientWebSocketResponse,
+        idle_timeout: float = STREAM_IDLE_TIMEOUT
+) -> None:
+    activity = {"last": time.monotonic()}
+    tasks = [
+        asyncio.ensure_future(relay_client_frames(websocket, upstream, activity)),
+        asyncio.ensure_future(relay_upstream_frames(websocket, upstream, activity)),
+        asyncio.ensure_future(watch_idle_connection(activity, idle_timeout)),
+    ]
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            if not task.cancelled() and task.exception() and not isinstance(task.exception(), WebSocketDisconnect):
+                log_exception("WebSocket relay failed", task.exception())
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    await upstream.close()
+    close_code = upstream.close_code
+    if close_code is None or close_code in UNSENDABLE_CLOSE_CODES:
+        close_code = status.WS_1000_NORMAL_CLOSURE
+    try:
+        await websocket.close(code=close_code)
+    except RuntimeError:
+        pass
+
+
+async def redirect_websocket(websocket: WebSocket, api_name: str, version: str, endpoint: str) -> None:
+    context["api_name"] = api_name
+    context["version"] = version
+    start_request_deadline(websocket.headers)
+
+    try:
+        await authorize_request(
+            context,
+            "GET",
+            api_name,
+            version,
+            f"/{endpoint}",
+            lambda: decode_and_check_jwt_token(get_bearer_token(websocket)),
+            get_user_groups_from_database,
+        )
+        check_rate_limit(context)
+        acquire_long_lived_connection(context["url"])
+    except HTTPException as e:
+        logger.info(
+            {
+                "message": f"WebSocket connection to {api_name} {version} /{endpoint} rejected with {e.status_code}",
+                "X-Request-ID": context.get("X-Request-ID")
+            }
+        )
+        if e.status_code in (status.HTTP_429_TOO_MANY_REQUESTS, status.HTTP_503_SERVICE_UNAVAILABLE):
+            await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
+        else:
+            await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    upstream = context["url"]
+    try:
+        headers = generate_headers(websocket)
+        for header in WEBSOCKET_HEADERS_TO_DELETE:
+            del headers[header]
+
+        url = f"ws{upstream[len('http'):]}{endpoint}"
+        if websocket.url.query:
+            url += f"?{websocket.url.query}"
+
+        try:
+            upstream_websocket = await asyncio.wait_for(
+                (await get_streaming_client_session()).ws_connect(
+                    url,
+                    headers=headers,
+                    protocols=websocket.scope.get("subprotocols", []),
+                ),
+                limit_timeout(context.get("timeout") or DEFAULT_UPSTREAM_TIMEOUT, "upstream WebSocket connection")
+            )
+        except Exception as e:
+            log_exception("Bad Gateway", e)
+            await websocket.close(code=status.WS_1014_BAD_GATEWAY)
+            return
+
+        await websocket.accept(subprotocol=upstream_websocket.protocol)
+        start_time = time.time()
+        await relay_websocket_frames(websocket, upstream_websocket)
+        logger.info(
+            {
+                "message": "WebSocket connection closed",
+                "request": {"path": websocket.url.path, "api_name": api_name, "version": version},
+                "user": {"username": context.get("user"), "group": context.get("group")},
+                "duration_ms": (time.time() - start_time) * 1000,
+                "X-Request-ID": context.get("X-Request-ID")
+            }
+        )
+    finally:
+        release_long_lived_connection(upstream)
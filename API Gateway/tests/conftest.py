@@ -0,0 +1,190 @@
+import os
+import sys
+import asyncio
+import logging
+import jwt
+import datetime
+import pytest
+from typing import Any, Dict, List, Optional, Tuple
+
+os.environ.setdefault("TOKEN_SECRET_KEY", "test-secret-key")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from fastapi.security import HTTPAuthorizationCredentials  # noqa: E402
+from starlette.requests import Request  # noqa: E402
+from utils import constants  # noqa: E402
+
+logging.getLogger("FluentBit").handlers.clear()
+
+
+DEMO_ONBOARDING_CONFIG = {
+    "api-name": "demo",
+    "namespace": "demo-namespace",
+    "port": 8000,
+    "version": "v1",
+    "endpoints": [
+        {"/example/endpoint": {"GET": "developer"}},
+        {"/example/endpoint2": {"GET": "AUTHENTICATE", "POST": "developer"}},
+        {"/example/endpoint3/specific": {"GET": "DENY_ALL_ACCESS"}},
+        {"/example/endpoint3/*": {"GET": "NO_AUTHENTICATION"}},
+        {"/example/admin": {"GET": ["admin", "developer"], "DELETE": "admin"}},
+        {"/example/any-method": {method: "NO_AUTHENTICATION" for method in ("PATCH", "HEAD", "OPTIONS")}},
+    ],
+}
+
+
+@pytest.fixture(autouse=True)
+def endpoint_rules():
+    constants.ENDPOINT_RULES.clear()
+    constants.populate_endpoint_rules(DEMO_ONBOARDING_CONFIG)
+    yield constants.ENDPOINT_RULES
+    constants.ENDPOINT_RULES.clear()
+
+
+@pytest.fixture(autouse=True)
+def rate_limit_buckets():
+    from utils import fair_queuing
+
+    fair_queuing.RATE_LIMIT_BUCKETS.clear()
+    yield fair_queuing.RATE_LIMIT_BUCKETS
+    fair_queuing.RATE_LIMIT_BUCKETS.clear()
+
+
+def create_token(username: str) -> HTTPAuthorizationCredentials:
+    token = jwt.encode(
+        {"sub": username, "exp": datetime.datetime.utcnow() + datetime.timedelta(hours=1)},
+        constants.TOKEN_SECRET_KEY,
+        algorithm=constants.ALGORITHM
+    )
+    return HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def make_request(method: str = "GET", path: str = "/", headers: Optional[Dict[str, str]] = None) -> Request:
+    headers = {"host": "gateway", **(headers or {})}
+    return Request(
+        {
+            "type": "http",
+            "method": method,
+            "path": path,
+            "query_string": b"",
+            "headers": [(name.lower().encode(), value.encode()) for name, value in headers.items()],
+            "client": ("10.0.0.1", 12345),
+        }
+    )
+
+
+async def call_asgi(
+        app,
+        method: str,
+        path: str,
+        headers: Optional[Dict[str, str]] = None,
+        body: bytes = b""
+) -> Tuple[int, Dict[str, str], bytes]:
+    path, _, query_string = path.partition("?")
+    scope = {
+        "type": "http",
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": query_string.encode(),
+        "headers": [(name.lower().encode(), value.encode()) for name, value in {"host": "gateway", **(headers or {})}.items()],
+        "client": ("10.0.0.1", 12345),
+        "server": ("gateway", 8000),
+    }
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+    sent = []
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        await asyncio.Event().wait()
+
+    async def send(message):
+        sent.append(message)
+
+    await app(scope, receive, send)
+    start = next(message for message in sent if message["type"] == "http.response.start")
+    response_headers = {name.decode(): value.decode() for name, value in start["headers"]}
+    response_body = b"".join(message.get("body", b"") for message in sent if message["type"] == "http.response.body")
+    return start["status"], response_headers, response_body
+
+
+class FakeResponse:
+    def __init__(self, status: int = 200, body: bytes = b'{"ok": true}', content_type: str = "application/json"):
+        self.status = status
+        self.headers = {"content-type": content_type}
+        self.body = body
+
+    async def read(self) -> bytes:
+        return self.body
+
+
+class FakeRequestContext:
+    def __init__(self, session: "FakeClientSession", call: Dict[str, Any]):
+        self.session = session
+        self.call = call
+
+    async def __aenter__(self) -> FakeResponse:
+        self.session.in_flight += 1
+        self.session.max_in_flight = max(self.session.max_in_flight, self.session.in_flight)
+        try:
+            await asyncio.sleep(self.session.delay)
+            if self.session.error is not None:
+                raise self.session.error
+        except BaseException:
+            self.session.in_flight -= 1
+            raise
+        return FakeResponse()
+
+    async def __aexit__(self, *exc_info) -> None:
+        self.session.in_flight -= 1
+
+
+class FakeClientSession:
+    def __init__(self, delay: float = 0, error: Optional[BaseException] = None):
+        self.delay = delay
+        self.error = error
+        self.calls: List[Dict[str, Any]] = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def request(self, **kwargs) -> FakeRequestContext:
+        self.calls.append(kwargs)
+        return FakeRequestContext(self, kwargs)
+
+
+@pytest.fixture
+def client_session(monkeypatch):
+    from utils import redirect_requests
+
+    session = FakeClientSession()
+
+    async def get_client_session():
+        return session
+
+    monkeypatch.setattr(redirect_requests, "get_client_session", get_client_session)
+    return session
+
+
+@pytest.fixture
+def user_groups(monkeypatch):
+    from utils import authorization, batch_requests, fast_path
+
+    memberships = {"alice": ["developer"], "bob": ["admin"]}
+    calls = []
+
+    async def get_user_groups_from_database(username: str, groups: List[str]) -> List[Dict[str, str]]:
+        calls.append((username, sorted(groups)))
+        return [{"group_name": group} for group in memberships.get(username, []) if group in groups]
+
+    monkeypatch.setattr(authorization, "get_user_groups_from_database", get_user_groups_from_database)
+    monkeypatch.setattr(batch_requests, "get_user_groups_from_database", get_user_groups_from_database)
+    monkeypatch.setattr(fast_path, "get_user_groups_from_database", get_user_groups_from_database)
+    return calls
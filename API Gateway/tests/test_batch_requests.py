@@ -0,0 +1,246 @@
+import pytest
+from aiohttp import ClientConnectorError, ClientResponseError, ServerTimeoutError
+from fastapi import HTTPException
+from fastapi.security import HTTPAuthorizationCredentials
+from starlette_context import request_cycle_context
+from conftest import run, make_request, create_token
+from utils import batch_requests, constants
+from utils.authorization import authorize_redirects
+from utils.batch_requests import BatchRequest, execute_batch, gather_batch_results, stream_batch_results
+from utils.redirect_requests import forward_request
+
+
+def run_batch(batch: dict, token=None, headers=None):
+    async def execute():
+        with request_cycle_context({"X-Request-ID": "batch-request"}):
+            request = make_request("POST", "/batch", headers)
+            return await gather_batch_results(execute_batch(request, BatchRequest(**batch), token))
+
+    return run(execute())
+
+
+def authorize_single(method: str, path: str, token) -> int:
+    async def execute():
+        with request_cycle_context({"X-Request-ID": "single-request"}):
+            api_name, version, endpoint, _ = batch_requests.parse_sub_request_path(path)
+            try:
+                await authorize_redirects(make_request(method, f"/{path}"), api_name, version, endpoint, token)
+            except HTTPException as e:
+                return e.status_code
+            return 200
+
+    return run(execute())
+
+
+SUB_REQUESTS = [
+    ("GET", "demo/api/v1/example/endpoint"),
+    ("GET", "demo/api/v1/example/endpoint2"),
+    ("POST", "demo/api/v1/example/endpoint2"),
+    ("GET", "demo/api/v1/example/endpoint3/specific"),
+    ("GET", "demo/api/v1/example/endpoint3/other"),
+    ("GET", "demo/api/v1/example/admin"),
+    ("DELETE", "demo/api/v1/example/admin"),
+    ("PUT", "demo/api/v1/example/admin"),
+    ("GET", "demo/api/v2/example/endpoint"),
+    ("GET", "unknown/api/v1/example/endpoint"),
+]
+
+
+@pytest.mark.parametrize("username", ["alice", "bob", "mallory", None])
+def test_batch_authorization_matches_authorize_redirects(username, client_session, user_groups):
+    token = create_token(username) if username else None
+    results = run_batch(
+        {"requests": [{"method": method, "path": path} for method, path in SUB_REQUESTS]},
+        token
+    )
+
+    expected = [authorize_single(method, path, token) for method, path in SUB_REQUESTS]
+    assert [result["status_code"] for result in results] == expected
+
+
+def test_batch_decodes_token_and_queries_groups_once(monkeypatch, client_session, user_groups):
+    decoded = []
+    decode_and_check_jwt_token = batch_requests.decode_and_check_jwt_token
+
+    def counting_decode(token):
+        decoded.append(token)
+        return decode_and_check_jwt_token(token)
+
+    monkeypatch.setattr(batch_requests, "decode_and_check_jwt_token", counting_decode)
+    results = run_batch(
+        {"requests": [{"method": method, "path": path} for method, path in SUB_REQUESTS]},
+        create_token("alice")
+    )
+
+    assert len(results) == len(SUB_REQUESTS)
+    assert len(decoded) == 1
+    assert user_groups == [("alice", ["admin", "developer"])]
+
+
+def test_batch_invalid_token_is_decoded_once(monkeypatch, client_session, user_groups):
+    decoded = []
+    decode_and_check_jwt_token = batch_requests.decode_and_check_jwt_token
+
+    def counting_decode(token):
+        decoded.append(token)
+        return decode_and_check_jwt_token(token)
+
+    monkeypatch.setattr(batch_requests, "decode_and_check_jwt_token", counting_decode)
+    token = HTTPAuthorizationCredentials(scheme="Bearer", credentials="not-a-jwt")
+    results = run_batch(
+        {"requests": [{"method": "GET", "path": "demo/api/v1/example/endpoint"}] * 3},
+        token
+    )
+
+    assert [result["status_code"] for result in results] == [401, 401, 401]
+    assert len(decoded) == 1
+    assert user_groups == []
+
+
+@pytest.mark.parametrize("requested, expected", [(2, 2), (None, constants.BATCH_MAX_CONCURRENCY), (1000, constants.BATCH_MAX_CONCURRENCY)])
+def test_batch_concurrency_is_capped(requested, expected, client_session, user_groups):
+    client_session.delay = 0.01
+    results = run_batch(
+        {
+            "requests": [{"method": "GET", "path": "demo/api/v1/example/endpoint3/other"}] * 25,
+            "concurrency": requested,
+        }
+    )
+
+    assert [result["status_code"] for result in results] == [200] * 25
+    assert client_session.max_in_flight == expected
+
+
+def test_batch_results_keep_request_order_and_ids(client_session, user_groups):
+    results = run_batch(
+        {
+            "requests": [
+                {"id": "first", "method": "GET", "path": "demo/api/v1/example/endpoint3/a?x=1"},
+                {"method": "post", "path": "/demo/api/v1/example/endpoint2", "body": {"k": 1}},
+            ]
+        },
+        create_token("alice")
+    )
+
+    assert results[0] == {
+        "index": 0,
+        "id": "first",
+        "status_code": 200,
+        "headers": {"content-type": "application/json", "content-length": "12"},
+        "body": {"ok": True},
+    }
+    assert results[1]["index"] == 1 and "id" not in results[1]
+    assert client_session.calls[0]["url"] == "http://demo.demo-namespace.svc.cluster.local:8000/example/endpoint3/a?x=1"
+    assert client_session.calls[1]["method"] == "POST"
+    assert client_session.calls[1]["data"] == b'{"k": 1}'
+    assert client_session.calls[1]["headers"]["content-type"] == "application/json"
+
+
+def test_batch_rejects_reserved_sub_request_headers(client_session, user_groups):
+    results = run_batch(
+        {
+            "requests": [
+                {"method": "GET", "path": "demo/api/v1/example/endpoint", "headers": {"Authorization": "Bearer other"}},
+                {"method": "GET", "path": "demo/api/v1/example/endpoint", "headers": {"api-user": "bob"}},
+            ]
+        },
+        create_token("alice")
+    )
+
+    assert [result["status_code"] for result in results] == [400, 400]
+    assert client_session.calls == []
+
+
+def test_batch_sets_api_user_only_for_authenticated_sub_requests(client_session, user_groups):
+    run_batch(
+        {
+            "requests": [
+                {"method": "GET", "path": "demo/api/v1/example/endpoint3/other"},
+                {"method": "GET", "path": "demo/api/v1/example/endpoint"},
+                {"method": "GET", "path": "demo/api/v1/example/endpoint3/other"},
+            ],
+            "concurrency": 1,
+        },
+        create_token("alice"),
+        headers={"API-User": "spoofed"}
+    )
+
+    api_users = {call["url"].rsplit("/", 1)[-1]: call["headers"].get("api-user") for call in client_session.calls}
+    assert api_users == {"other": None, "endpoint": "alice"}
+
+
+def test_batch_database_failure_only_fails_dependent_sub_requests(monkeypatch, client_session):
+    async def failing_lookup(username, groups):
+        raise ConnectionError("database is down")
+
+    monkeypatch.setattr(batch_requests, "get_user_groups_from_database", failing_lookup)
+    results = run_batch(
+        {
+            "requests": [
+                {"method": "GET", "path": "demo/api/v1/example/endpoint"},
+                {"method": "GET", "path": "demo/api/v1/example/endpoint3/other"},
+                {"method": "POST", "path": "demo/api/v1/example/endpoint2"},
+            ]
+        },
+        create_token("alice")
+    )
+
+    assert [result["status_code"] for result in results] == [500, 200, 500]
+
+
+def test_batch_stream_yields_every_result(client_session, user_groups):
+    async def execute():
+        with request_cycle_context({"X-Request-ID": "batch-request"}):
+            batch = BatchRequest(
+                requests=[{"method": "GET", "path": "demo/api/v1/example/endpoint3/other"}] * 3,
+                stream=True
+            )
+            tasks = execute_batch(make_request("POST", "/batch"), batch, None)
+            return [line async for line in stream_batch_results(tasks)]
+
+    lines = run(execute())
+    assert len(lines) == 3 and all(line.endswith(b"\n") for line in lines)
+
+
+@pytest.mark.parametrize("size, status_code", [(0, 400), (constants.BATCH_MAX_REQUESTS + 1, 413)])
+def test_batch_size_is_validated(size, status_code):
+    with pytest.raises(HTTPException) as exc_info:
+        run_batch({"requests": [{"method": "GET", "path": "demo/api/v1/example/endpoint"}] * size})
+
+    assert exc_info.value.status_code == status_code
+
+
+@pytest.mark.parametrize(
+    "error, status_code",
+    [
+        (ClientConnectorError(None, OSError("refused")), 502),
+        (ClientResponseError(None, (), status=503), 503),
+        (ClientResponseError(None, (), status=500), 502),
+        (ServerTimeoutError(), 504),
+        (ValueError("unexpected"), 500),
+    ]
+)
+def test_forward_request_maps_upstream_errors(error, status_code, client_session):
+    client_session.error = error
+
+    async def execute():
+        with request_cycle_context({"X-Request-ID": "single-request"}):
+            await forward_request({}, "GET", "http://upstream/", {}, b"")
+
+    with pytest.raises(HTTPException) as exc_info:
+        run(execute())
+
+    assert exc_info.value.status_code == status_code
+
+
+def test_forward_request_returns_upstream_response(client_session):
+    state = {}
+
+    async def execute():
+        with request_cycle_context({"X-Request-ID": "single-request"}):
+            return await forward_request(state, "GET", "http://upstream/", {}, b"")
+
+    response = run(execute())
+    assert response.status_code == 200
+    assert response.body == b'{"ok": true}'
+    assert state["backend_end_time"] >= state["backend_start_time"]
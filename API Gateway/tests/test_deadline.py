@@ -0,0 +1,192 @@
+import time
+import asyncio
+import pytest
+from fastapi import HTTPException
+from starlette_context import request_cycle_context
+from conftest import run, call_asgi
+from utils import constants, database_and_client
+from utils.authorization import authorize_request
+from utils.database_and_client import retry_database_query
+from utils.deadline import get_request_timeout
+from utils.fast_path import FastPathRouter
+from utils.redirect_requests import forward_request
+
+
+def in_request(coroutine_function, timeout: float = None):
+    async def execute():
+        initial_data = {"X-Request-ID": "deadline-request"}
+        if timeout is not None:
+            initial_data["deadline"] = time.time() + timeout
+        with request_cycle_context(initial_data):
+            return await coroutine_function()
+
+    return run(execute())
+
+
+@pytest.mark.parametrize(
+    "headers, expected",
+    [
+        ({}, constants.DEFAULT_REQUEST_TIMEOUT),
+        ({constants.DEADLINE_HEADER: "1500"}, 1.5),
+        ({constants.DEADLINE_HEADER: "not-a-number"}, constants.DEFAULT_REQUEST_TIMEOUT),
+        ({constants.DEADLINE_HEADER: "nan"}, constants.DEFAULT_REQUEST_TIMEOUT),
+        ({constants.DEADLINE_HEADER: "inf"}, constants.DEFAULT_REQUEST_TIMEOUT),
+        ({constants.DEADLINE_HEADER: "-inf"}, constants.DEFAULT_REQUEST_TIMEOUT),
+        ({constants.DEADLINE_HEADER: str(int(constants.MAX_REQUEST_TIMEOUT * 1000 + 1))}, constants.MAX_REQUEST_TIMEOUT),
+    ]
+)
+def test_request_timeout_comes_from_header_or_default(headers, expected):
+    assert get_request_timeout(headers) == expected
+
+
+def test_onboarding_timeouts():
+    constants.populate_endpoint_rules(
+        {
+            "api-name": "timeouts",
+            "namespace": "timeouts-namespace",
+            "port": 8000,
+            "version": "v1",
+            "timeout": 7,
+            "endpoints": [
+                {"/rule": {"GET": "NO_AUTHENTICATION", "timeout": 2.5}},
+                {"/api-default": {"GET": "NO_AUTHENTICATION"}},
+            ],
+        }
+    )
+    constants.populate_endpoint_rules(
+        {
+            "api-name": "timeouts",
+            "namespace": "timeouts-namespace",
+            "port": 8000,
+            "version": "v2",
+            "endpoints": [{"/default": {"GET": "NO_AUTHENTICATION"}}],
+        }
+    )
+
+    rules = constants.ENDPOINT_RULES["timeouts"]
+    configs = [next(iter(rule.values())) for rule in rules["v1"] + rules["v2"]]
+    assert [config["timeout"] for config in configs] == [2.5, 7.0, constants.DEFAULT_UPSTREAM_TIMEOUT]
+    assert all(list(config["methods"]) == ["GET"] for config in configs)
+
+
+@pytest.mark.parametrize("method", ["url", "timeout", "methods"])
+def test_rule_metadata_is_not_looked_up_as_a_method(method, user_groups):
+    def get_username():
+        raise AssertionError("the token must not be decoded")
+
+    async def authorize():
+        await authorize_request(
+            {},
+            method,
+            "demo",
+            "v1",
+            "/example/endpoint",
+            get_username,
+            database_and_client.get_user_groups_from_database
+        )
+
+    with pytest.raises(HTTPException) as exc_info:
+        in_request(authorize)
+
+    assert exc_info.value.status_code == 405
+    assert user_groups == []
+
+
+def test_expired_deadline_is_rejected_before_authorization(user_groups):
+    async def authorize():
+        await authorize_request(
+            {},
+            "GET",
+            "demo",
+            "v1",
+            "/example/endpoint",
+            lambda: "alice",
+            database_and_client.get_user_groups_from_database
+        )
+
+    with pytest.raises(HTTPException) as exc_info:
+        in_request(authorize, timeout=-1)
+
+    assert exc_info.value.status_code == 504
+    assert user_groups == []
+
+
+@pytest.mark.parametrize("rule_timeout, deadline, expected", [(5, 2, 2), (0.5, 2, 0.5), (None, None, constants.DEFAULT_UPSTREAM_TIMEOUT)])
+def test_upstream_timeout_is_limited_by_rule_and_deadline(rule_timeout, deadline, expected, client_session):
+    state = {"timeout": rule_timeout}
+    headers = {}
+    in_request(lambda: forward_request(state, "GET", "http://upstream/", headers, b""), timeout=deadline)
+
+    total = client_session.calls[0]["timeout"].total
+    assert total == pytest.approx(expected, abs=0.05)
+    if deadline is None:
+        assert constants.DEADLINE_HEADER not in headers
+    else:
+        assert int(headers[constants.DEADLINE_HEADER]) == pytest.approx(expected * 1000, abs=50)
+
+
+def test_upstream_timeout_maps_to_gateway_timeout(client_session):
+    client_session.error = asyncio.TimeoutError()
+
+    with pytest.raises(HTTPException) as exc_info:
+        in_request(lambda: forward_request({}, "GET", "http://upstream/", {}, b""), timeout=1)
+
+    assert exc_info.value.status_code == 504
+
+
+class FailingPool:
+    def __init__(self, delay: float = 0):
+        self.delay = delay
+        self.attempts = 0
+
+    def acquire(self):
+        return self
+
+    async def __aenter__(self):
+        self.attempts += 1
+        await asyncio.sleep(self.delay)
+        raise ConnectionError("database is down")
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+
+@pytest.mark.parametrize("delay", [0, 5])
+def test_database_retries_stop_at_the_deadline(delay, monkeypatch):
+    pool = FailingPool(delay)
+    monkeypatch.setattr(database_and_client, "database_pool", pool)
+
+    start_time = time.time()
+    with pytest.raises(HTTPException) as exc_info:
+        in_request(lambda: retry_database_query("SELECT 1"), timeout=0.3)
+
+    assert exc_info.value.status_code == 504
+    assert time.time() - start_time < 0.6
+    assert pool.attempts == 1
+
+
+def test_database_retries_without_deadline_keep_internal_server_error(monkeypatch):
+    monkeypatch.setattr(database_and_client, "database_pool", FailingPool())
+
+    async def no_sleep(seconds):
+        pass
+
+    monkeypatch.setattr(database_and_client.asyncio, "sleep", no_sleep)
+    with pytest.raises(HTTPException) as exc_info:
+        in_request(lambda: retry_database_query("SELECT 1"))
+
+    assert exc_info.value.status_code == 500
+
+
+def test_fast_path_abandons_expired_requests(client_session, user_groups):
+    status_code, _, _ = run(
+        call_asgi(
+            FastPathRouter(None),
+            "GET",
+            "/demo/api/v1/example/endpoint3/other",
+            {constants.DEADLINE_HEADER: "0"}
+        )
+    )
+
+    assert status_code == 504
+    assert client_session.calls == []
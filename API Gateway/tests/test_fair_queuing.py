@@ -0,0 +1,183 @@
+import time
+import asyncio
+import pytest
+from fastapi import HTTPException
+from starlette_context import request_cycle_context
+from conftest import run, call_asgi, create_token
+from utils import constants, fair_queuing, streaming
+from utils.fair_queuing import FairQueue, check_rate_limit
+from utils.fast_path import FastPathRouter
+from utils.redirect_requests import forward_request
+
+
+async def dispatch_order(queue: FairQueue, requests, hold: float = 0.01):
+    order = []
+
+    async def execute(flow, weight):
+        await queue.acquire(flow, weight)
+        order.append(flow)
+        await asyncio.sleep(hold)
+        queue.release()
+
+    await queue.acquire("busy", 1)
+    tasks = [asyncio.ensure_future(execute(flow, weight)) for flow, weight in requests]
+    await asyncio.sleep(0)
+    queue.release()
+    await asyncio.gather(*tasks)
+    return order
+
+
+def test_quiet_flow_is_not_stuck_behind_noisy_flow():
+    order = run(dispatch_order(FairQueue(1), [("noisy", 1)] * 8 + [("quiet", 1)] * 2))
+
+    assert order.index("quiet") <= 1
+    assert order[:4].count("quiet") == 2
+
+
+def test_slots_are_shared_in_proportion_to_weight():
+    order = run(dispatch_order(FairQueue(1), [("admin", 8)] * 12 + [("developer", 4)] * 12))
+
+    assert order[:12].count("admin") == 8
+    assert order[:12].count("developer") == 4
+
+
+def test_abandoned_waiters_do_not_leak_slots():
+    queue = FairQueue(1)
+
+    async def execute():
+        await queue.acquire("first", 1)
+        with pytest.raises(asyncio.TimeoutError):
+            await queue.acquire("second", 1, timeout=0.01)
+        queue.release()
+        await asyncio.wait_for(queue.acquire("third", 1), 1)
+        queue.release()
+
+    run(execute())
+
+    assert queue.in_flight == 0
+    assert queue.waiting == []
+    assert queue.finish_tags == {}
+
+
+def test_queue_wait_is_bounded_by_the_deadline(monkeypatch, client_session):
+    queue = FairQueue(1)
+    monkeypatch.setattr(fair_queuing, "UPSTREAM_QUEUE", queue)
+
+    async def execute():
+        await queue.acquire("busy", 1)
+        with request_cycle_context({"X-Request-ID": "queued-request", "deadline": time.time() + 0.05}):
+            await forward_request({"user": "alice", "group": "developer"}, "GET", "http://upstream/", {}, b"")
+
+    with pytest.raises(HTTPException) as exc_info:
+        run(execute())
+
+    assert exc_info.value.status_code == 504
+    assert client_session.calls == []
+    assert queue.in_flight == 1
+
+
+def test_event_stream_accept_header_does_not_skip_the_queue(monkeypatch, user_groups):
+    queue = FairQueue(1)
+    monkeypatch.setattr(fair_queuing, "UPSTREAM_QUEUE", queue)
+    calls = []
+
+    class StreamingSession:
+        async def request(self, **kwargs):
+            calls.append(kwargs)
+
+    async def get_streaming_client_session():
+        return StreamingSession()
+
+    monkeypatch.setattr(streaming, "get_streaming_client_session", get_streaming_client_session)
+
+    async def execute():
+        await queue.acquire("busy", 1)
+        return await call_asgi(
+            FastPathRouter(None),
+            "GET",
+            "/demo/api/v1/example/endpoint3/events",
+            {"Accept": "text/event-stream", constants.DEADLINE_HEADER: "50"}
+        )
+
+    status_code, _, _ = run(execute())
+
+    assert status_code == 504
+    assert calls == []
+    assert queue.in_flight == 1
+    assert streaming.LONG_LIVED_CONNECTIONS == {}
+
+
+def test_queue_time_is_recorded(client_session):
+    state = {"group": constants.NO_AUTHENTICATION_FLAG}
+
+    async def execute():
+        with request_cycle_context({"X-Request-ID": "queued-request"}):
+            await forward_request(state, "GET", "http://upstream/", {}, b"")
+
+    run(execute())
+
+    assert state["upstream_queue_time"] >= 0
+    assert fair_queuing.UPSTREAM_QUEUE.in_flight == 0
+
+
+@pytest.mark.parametrize(
+    "state, expected",
+    [
+        ({"user": "bob", "group": "admin"}, 8),
+        ({"user": "alice", "group": "developer"}, 4),
+        ({"user": "carol", "group": "AUTHENTICATE"}, 2),
+        ({"group": "NO_AUTHENTICATION"}, 1),
+        ({"user": "dave", "group": "unlisted"}, constants.DEFAULT_GROUP_WEIGHT),
+    ]
+)
+def test_flow_weights_follow_the_group(state, expected):
+    assert fair_queuing.get_flow_weight(state) == expected
+
+
+def test_rate_limit_is_per_user(monkeypatch, client_session, user_groups):
+    monkeypatch.setattr(fair_queuing, "RATE_LIMIT_PER_SECOND", 0.5)
+    monkeypatch.setattr(fair_queuing, "RATE_LIMIT_BURST", 2)
+
+    def call(username: str):
+        token = create_token(username)
+        return run(
+            call_asgi(
+                FastPathRouter(None),
+                "GET",
+                "/demo/api/v1/example/endpoint2",
+                {"Authorization": f"Bearer {token.credentials}"}
+            )
+        )
+
+    statuses = [call("alice")[0] for _ in range(3)]
+    status_code, headers, _ = call("alice")
+
+    assert statuses == [200, 200, 429]
+    assert (status_code, headers["retry-after"]) == (429, "2")
+    assert call("bob")[0] == 200
+    assert len(client_session.calls) == 3
+
+
+def test_rate_limit_is_off_by_default_and_skips_anonymous_traffic(monkeypatch):
+    assert constants.RATE_LIMIT_PER_SECOND == 0
+    monkeypatch.setattr(fair_queuing, "RATE_LIMIT_PER_SECOND", 1)
+    monkeypatch.setattr(fair_queuing, "RATE_LIMIT_BURST", 1)
+
+    with request_cycle_context({"X-Request-ID": "anonymous-request"}):
+        for _ in range(3):
+            check_rate_limit({"group": constants.NO_AUTHENTICATION_FLAG})
+
+    assert fair_queuing.RATE_LIMIT_BUCKETS == {}
+
+
+@pytest.mark.parametrize(
+    "overrides, expected",
+    [
+        ('{"admin": 16, "support": 3}', {"admin": 16.0, "support": 3.0}),
+        ('{"admin": 0, "developer": -1, "support": "high", "ops": true, "qa": NaN}', {}),
+        ("[1, 2]", {}),
+        ("not json", {}),
+    ]
+)
+def test_group_weight_overrides_must_be_positive_numbers(overrides, expected):
+    assert constants.read_group_weight_overrides(overrides) == expected
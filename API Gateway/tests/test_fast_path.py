@@ -0,0 +1,118 @@
+import json
+import pytest
+from fastapi.responses import PlainTextResponse
+from conftest import run, call_asgi, create_token
+from utils.fast_path import FastPathRouter
+
+
+async def fallback_app(scope, receive, send):
+    await PlainTextResponse("fallback")(scope, receive, send)
+
+
+@pytest.fixture
+def gateway_apps():
+    import app as gateway
+
+    user_middleware = gateway.app.user_middleware
+    without_fast_path = [middleware for middleware in user_middleware if middleware.cls is not FastPathRouter]
+
+    def build(fast_path: bool):
+        gateway.app.user_middleware = user_middleware if fast_path else without_fast_path
+        gateway.app.middleware_stack = None
+        return gateway.app
+
+    yield build
+    gateway.app.user_middleware = user_middleware
+    gateway.app.middleware_stack = None
+
+
+@pytest.mark.parametrize("path", ["/login", "/batch", "/demo/v1/example", "/demo/api/v1"])
+def test_non_proxied_paths_are_passed_through(path, client_session):
+    status_code, _, body = run(call_asgi(FastPathRouter(fallback_app), "POST", path))
+
+    assert (status_code, body) == (200, b"fallback")
+    assert client_session.calls == []
+
+
+@pytest.mark.parametrize("method", ["PATCH", "HEAD", "OPTIONS"])
+def test_all_methods_are_routable(method, client_session, user_groups):
+    status_code, headers, _ = run(call_asgi(FastPathRouter(fallback_app), method, "/demo/api/v1/example/any-method?a=1"))
+
+    assert status_code == 200
+    assert "x-request-id" in headers
+    assert client_session.calls[0]["method"] == method
+    assert client_session.calls[0]["url"] == "http://demo.demo-namespace.svc.cluster.local:8000/example/any-method?a=1"
+
+
+@pytest.mark.parametrize("method", ["url", "timeout", "TRACE"])
+def test_non_proxy_methods_are_rejected_like_the_regular_route(method, gateway_apps, client_session, user_groups):
+    token = create_token("alice")
+    headers = {"Authorization": f"Bearer {token.credentials}"}
+    responses = [
+        run(call_asgi(gateway_apps(fast_path), method, "/demo/api/v1/example/endpoint2", headers))
+        for fast_path in (False, True)
+    ]
+
+    assert [status_code for status_code, _, _ in responses] == [405, 405]
+    assert responses[0][2] == responses[1][2]
+    assert client_session.calls == []
+    assert user_groups == []
+
+
+def test_request_id_is_forwarded_and_returned(client_session, user_groups):
+    request_id = "0f0e1b1c7bbd4e58a1d1a1b3b27e6d2a"
+    _, headers, _ = run(
+        call_asgi(
+            FastPathRouter(fallback_app),
+            "GET",
+            "/demo/api/v1/example/endpoint3/other",
+            {"X-Request-ID": request_id}
+        )
+    )
+
+    assert headers["x-request-id"] == request_id
+    assert client_session.calls[0]["headers"]["x-request-id"] == request_id
+
+
+def test_authenticated_user_is_forwarded(client_session, user_groups):
+    token = create_token("alice")
+    status_code, _, _ = run(
+        call_asgi(
+            FastPathRouter(fallback_app),
+            "POST",
+            "/demo/api/v1/example/endpoint2",
+            {"Authorization": f"Bearer {token.credentials}"},
+            b"payload"
+        )
+    )
+
+    assert status_code == 200
+    assert client_session.calls[0]["headers"]["api-user"] == "alice"
+    assert client_session.calls[0]["data"] == b"payload"
+
+
+@pytest.mark.parametrize(
+    "method, path, username",
+    [
+        ("GET", "/demo/api/v1/example/endpoint", "alice"),
+        ("GET", "/demo/api/v1/example/endpoint", "bob"),
+        ("GET", "/demo/api/v1/example/endpoint", None),
+        ("GET", "/demo/api/v1/example/endpoint2", "mallory"),
+        ("POST", "/demo/api/v1/example/endpoint2", "bob"),
+        ("GET", "/demo/api/v1/example/endpoint3/specific", "alice"),
+        ("GET", "/demo/api/v1/example/endpoint3/other", None),
+        ("DELETE", "/demo/api/v1/example/admin", "bob"),
+        ("PUT", "/demo/api/v1/example/admin", "bob"),
+        ("PATCH", "/demo/api/v1/example/any-method", None),
+        ("GET", "/demo/api/v2/example/endpoint", "alice"),
+        ("GET", "/unknown/api/v1/example/endpoint", "alice"),
+    ]
+)
+def test_fast_path_matches_fastapi_routes(method, path, username, gateway_apps, client_session, user_groups):
+    headers = {"Authorization": f"Bearer {create_token(username).credentials}"} if username else {}
+
+    fast_status_code, _, fast_body = run(call_asgi(gateway_apps(True), method, path, headers))
+    status_code, _, body = run(call_asgi(gateway_apps(False), method, path, headers))
+
+    assert fast_status_code == status_code
+    assert json.loads(fast_body) == json.loads(body)
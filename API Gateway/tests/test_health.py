@@ -0,0 +1,149 @@
+import time
+import asyncio
+import pytest
+from conftest import run, call_asgi, FakeClientSession
+from utils import database_and_client, health
+
+
+class FakeConnection:
+    async def fetchval(self, query: str, timeout: float = None):
+        return 1
+
+
+class FakePool:
+    def __init__(self, max_size: int = 5, delay: float = 0.01):
+        self.max_size = max_size
+        self.delay = delay
+        self.in_use = 0
+        self.max_in_use = 0
+        self.timeouts = []
+        self.closed = False
+
+    def get_max_size(self) -> int:
+        return self.max_size
+
+    def acquire(self, timeout: float = None):
+        self.timeouts.append(timeout)
+        return self
+
+    async def __aenter__(self) -> FakeConnection:
+        self.in_use += 1
+        self.max_in_use = max(self.max_in_use, self.in_use)
+        try:
+            await asyncio.wait_for(asyncio.sleep(self.delay), self.timeouts[-1])
+        except BaseException:
+            self.in_use -= 1
+            raise
+        return FakeConnection()
+
+    async def __aexit__(self, *exc_info):
+        self.in_use -= 1
+
+    async def close(self):
+        self.closed = True
+
+
+class ClosableClientSession(FakeClientSession):
+    closed = False
+
+    async def close(self):
+        self.closed = True
+
+
+@pytest.fixture(autouse=True)
+def gateway_state(monkeypatch, tmp_path):
+    monkeypatch.setattr(health, "DRAINING_FILE", str(tmp_path / "draining"))
+    health.GATEWAY_STATE["ready"] = False
+    yield health.GATEWAY_STATE
+    health.GATEWAY_STATE["ready"] = False
+
+
+@pytest.fixture
+def lifespan_dependencies(monkeypatch):
+    pool = FakePool()
+    sessions = {"client": ClosableClientSession(), "streaming": ClosableClientSession()}
+    verified = []
+
+    async def create_pool(**kwargs):
+        return pool
+
+    monkeypatch.setattr(database_and_client, "create_pool", create_pool)
+    monkeypatch.setattr(database_and_client, "client_session", sessions["client"])
+    monkeypatch.setattr(database_and_client, "streaming_client_session", sessions["streaming"])
+    monkeypatch.setattr(database_and_client.PASSWORD_CONTEXT, "dummy_verify", lambda: verified.append(True))
+    return pool, sessions, verified
+
+
+async def wait_until_ready(timeout: float = 1) -> float:
+    start_time = time.time()
+    while not health.GATEWAY_STATE["ready"]:
+        if time.time() - start_time > timeout:
+            raise AssertionError("gateway never became ready")
+        await asyncio.sleep(0.01)
+    return time.time() - start_time
+
+
+def test_probes_skip_the_context_middleware(gateway_state):
+    import app as gateway
+
+    status_code, headers, body = run(call_asgi(gateway.app, "GET", "/healthz"))
+    assert (status_code, body) == (200, b'{"status":"ok"}')
+    assert "x-request-id" not in headers
+
+    assert run(call_asgi(gateway.app, "GET", "/readyz"))[0] == 503
+    gateway_state["ready"] = True
+    assert run(call_asgi(gateway.app, "GET", "/readyz"))[0] == 200
+
+
+def test_draining_file_takes_the_gateway_out_of_rotation(gateway_state):
+    gateway_state["ready"] = True
+    open(health.DRAINING_FILE, "w").close()
+
+    assert run(call_asgi(health.HealthCheckMiddleware(None), "GET", "/readyz"))[0] == 503
+    assert run(call_asgi(health.HealthCheckMiddleware(None), "GET", "/healthz"))[0] == 200
+
+
+def test_warm_up_runs_after_startup_and_gates_readiness(gateway_state, lifespan_dependencies):
+    pool, sessions, verified = lifespan_dependencies
+
+    async def execute():
+        async with database_and_client.lifespan(None):
+            ready_at_startup = gateway_state["ready"]
+            await wait_until_ready()
+            return ready_at_startup
+
+    assert run(execute()) is False
+    assert pool.max_in_use == pool.max_size
+    assert verified == [True]
+    assert len(sessions["client"].calls) == database_and_client.WARMUP_CONNECTIONS_PER_UPSTREAM
+    assert sessions["client"].calls[0]["method"] == "HEAD"
+    assert sessions["client"].calls[0]["url"] == "http://demo.demo-namespace.svc.cluster.local:8000/"
+    assert pool.closed and sessions["client"].closed and sessions["streaming"].closed
+
+
+def test_warm_up_failures_do_not_block_readiness(monkeypatch, gateway_state, lifespan_dependencies):
+    pool, sessions, _ = lifespan_dependencies
+    sessions["client"].error = ConnectionError("upstream is down")
+    pool.delay = 60
+    monkeypatch.setattr(database_and_client, "WARMUP_TIMEOUT", 0.05)
+
+    async def execute():
+        async with database_and_client.lifespan(None):
+            return await wait_until_ready()
+
+    assert run(execute()) < 0.5
+    assert set(pool.timeouts) == {0.05}
+
+
+def test_shutdown_cancels_an_unfinished_warm_up(gateway_state, lifespan_dependencies):
+    pool, _, _ = lifespan_dependencies
+    pool.delay = 60
+
+    async def execute():
+        async with database_and_client.lifespan(None):
+            await asyncio.sleep(0.05)
+
+    run(asyncio.wait_for(execute(), 1))
+
+    assert not gateway_state["ready"]
+    assert pool.closed
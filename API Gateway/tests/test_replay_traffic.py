@@ -0,0 +1,117 @@
+import os
+import sys
+import json
+import datetime
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tools"))
+
+import replay_traffic  # noqa: E402
+
+
+def access_event(timestamp: str, path: str = "/demo/api/v1/example/endpoint", **overrides):
+    event = {
+        "timestamp": timestamp,
+        "X-Request-ID": f"request-{timestamp}",
+        "message": "API request",
+        "request": {"method": "GET", "path": path},
+        "response": {"status_code": 200, "response_time_ms": 12.5},
+    }
+    event.update(overrides)
+    return event
+
+
+def write_log(tmp_path, lines):
+    path = tmp_path / "access.log"
+    path.write_text("\n".join(line if isinstance(line, str) else json.dumps(line) for line in lines), encoding="utf-8")
+    return str(path)
+
+
+@pytest.mark.parametrize(
+    "timestamp, expected",
+    [
+        ("2024-05-01T10:00:00.250000Z", datetime.datetime(2024, 5, 1, 10, 0, 0, 250000)),
+        ("2024-05-01T10:00:00Z", datetime.datetime(2024, 5, 1, 10, 0, 0)),
+        ("2024-05-01T10:00:00", datetime.datetime(2024, 5, 1, 10, 0, 0)),
+    ]
+)
+def test_parse_timestamp(timestamp, expected):
+    assert replay_traffic.parse_timestamp(timestamp) == expected.replace(tzinfo=datetime.timezone.utc).timestamp()
+
+
+def test_load_replay_plan_orders_events_and_skips_the_rest(tmp_path):
+    path = write_log(
+        tmp_path,
+        [
+            access_event("2024-05-01T10:00:01.500000Z", user={"username": "alice"}),
+            {"result": {"_raw": json.dumps(access_event("2024-05-01T10:00:00Z", request={"method": "POST", "path": "/demo/api/v1/x", "query_params": "?a=1"}))}},
+            {"event": access_event("2024-05-01T10:00:03Z", path="/other/api/v1/y")},
+            {"message": "Created token for alice"},
+            access_event("not a timestamp"),
+            "not json",
+            "",
+        ]
+    )
+
+    plan = replay_traffic.load_replay_plan(path)
+
+    assert [(entry["method"], entry["path"], entry["offset"]) for entry in plan] == [
+        ("POST", "/demo/api/v1/x", 0),
+        ("GET", "/demo/api/v1/example/endpoint", 1.5),
+        ("GET", "/other/api/v1/y", 3),
+    ]
+    assert plan[0]["query_params"] == "?a=1"
+    assert [entry["username"] for entry in plan] == [None, "alice", None]
+    assert plan[1]["recorded_status_code"] == 200
+    assert plan[1]["recorded_response_time_ms"] == 12.5
+
+
+def test_load_replay_plan_filters_by_path_prefix(tmp_path):
+    path = write_log(
+        tmp_path,
+        [access_event("2024-05-01T10:00:00Z"), access_event("2024-05-01T10:00:01Z", path="/other/api/v1/y")]
+    )
+
+    plan = replay_traffic.load_replay_plan(path, ["/other/"])
+
+    assert [entry["path"] for entry in plan] == ["/other/api/v1/y"]
+
+
+def replay_result(recorded_status_code, status_code, recorded_latency, latency, path="/demo/api/v1/a"):
+    return {
+        "method": "GET",
+        "path": path,
+        "recorded_status_code": recorded_status_code,
+        "recorded_response_time_ms": recorded_latency,
+        "status_code": status_code,
+        "response_time_ms": latency,
+    }
+
+
+def test_compare_results_uses_the_same_requests_for_both_distributions():
+    results = [
+        replay_result(200, 200, 10, 15),
+        replay_result(200, 200, 20, 25),
+        replay_result(200, None, 1000, 30000),
+        replay_result(200, 503, 30, 35, path="/demo/api/v1/b"),
+    ]
+
+    report = replay_traffic.compare_results(results, baseline_rtt_ms=5)
+
+    assert report["requests"] == 4
+    assert report["failed_requests"] == 1
+    assert report["latency_ms"]["recorded_gateway_side"]["max"] == 30
+    assert report["latency_ms"]["replayed_client_side"]["max"] == 35
+    assert report["latency_ms"]["replayed_minus_baseline_rtt"]["max"] == 30
+    assert report["latency_ms"]["replayed_minus_baseline_rtt"]["mean"] == report["latency_ms"]["recorded_gateway_side"]["mean"]
+    assert report["status_codes"]["replayed"] == {200: 2, None: 1, 503: 1}
+    assert report["status_code_mismatches"] == 2
+    assert {mismatch["path"] for mismatch in report["top_mismatches"]} == {"/demo/api/v1/a", "/demo/api/v1/b"}
+
+
+def test_compare_results_without_baseline():
+    report = replay_traffic.compare_results([replay_result(200, 200, 10, 15)])
+
+    assert report["baseline_rtt_ms"] is None
+    assert report["latency_ms"]["replayed_minus_baseline_rtt"] == {}
+    replay_traffic.print_report(report, 1.0)
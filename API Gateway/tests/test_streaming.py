@@ -0,0 +1,250 @@
+import time
+import asyncio
+import pytest
+from aiohttp import WSMsgType
+from fastapi import HTTPException
+from starlette_context import request_cycle_context
+from conftest import run, call_asgi
+from utils import fair_queuing, streaming
+from utils.constants import DEADLINE_HEADER
+from utils.fast_path import FastPathRouter
+
+
+class FakeStreamContent:
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    async def iter_any(self):
+        for chunk in self.chunks:
+            await asyncio.sleep(0)
+            yield chunk
+
+
+class FakeStreamResponse:
+    def __init__(self, content_type: str, chunks):
+        self.status = 200
+        self.headers = {"content-type": content_type, "transfer-encoding": "chunked"}
+        self.content = FakeStreamContent(chunks)
+        self.released = False
+        self.read_delay = 0
+
+    async def read(self) -> bytes:
+        await asyncio.sleep(self.read_delay)
+        return b"".join(self.content.chunks)
+
+    def release(self) -> None:
+        self.released = True
+
+
+class FakeStreamingSession:
+    def __init__(self, response: FakeStreamResponse):
+        self.response = response
+        self.calls = []
+
+    async def request(self, **kwargs) -> FakeStreamResponse:
+        self.calls.append(kwargs)
+        return self.response
+
+
+@pytest.fixture(autouse=True)
+def long_lived_connections():
+    streaming.LONG_LIVED_CONNECTIONS.clear()
+    yield streaming.LONG_LIVED_CONNECTIONS
+    streaming.LONG_LIVED_CONNECTIONS.clear()
+
+
+@pytest.fixture
+def streaming_session(monkeypatch):
+    def install(content_type: str, chunks):
+        session = FakeStreamingSession(FakeStreamResponse(content_type, chunks))
+
+        async def get_streaming_client_session():
+            return session
+
+        monkeypatch.setattr(streaming, "get_streaming_client_session", get_streaming_client_session)
+        return session
+
+    return install
+
+
+def test_long_lived_connections_are_capped_per_upstream(monkeypatch):
+    monkeypatch.setattr(streaming, "MAX_LONG_LIVED_CONNECTIONS_PER_UPSTREAM", 2)
+
+    with request_cycle_context({"X-Request-ID": "streaming-request"}):
+        streaming.acquire_long_lived_connection("http://a/")
+        streaming.acquire_long_lived_connection("http://a/")
+        streaming.acquire_long_lived_connection("http://b/")
+        with pytest.raises(HTTPException) as exc_info:
+            streaming.acquire_long_lived_connection("http://a/")
+        assert exc_info.value.status_code == 503
+
+        streaming.release_long_lived_connection("http://a/")
+        streaming.acquire_long_lived_connection("http://a/")
+
+    for upstream in ("http://a/", "http://a/", "http://b/"):
+        streaming.release_long_lived_connection(upstream)
+    assert streaming.LONG_LIVED_CONNECTIONS == {}
+
+
+def test_event_stream_is_relayed_chunk_by_chunk(streaming_session, user_groups):
+    chunks = [b"data: 1\n\n", b"data: 2\n\n", b"data: 3\n\n"]
+    session = streaming_session("text/event-stream", chunks)
+
+    status_code, headers, body = run(
+        call_asgi(FastPathRouter(None), "GET", "/demo/api/v1/example/endpoint3/events", {"Accept": "text/event-stream"})
+    )
+
+    assert status_code == 200
+    assert body == b"".join(chunks)
+    assert "transfer-encoding" not in headers
+    assert session.calls[0]["timeout"].total is None
+    assert session.calls[0]["timeout"].sock_read == streaming.STREAM_IDLE_TIMEOUT
+    assert session.response.released
+    assert fair_queuing.UPSTREAM_QUEUE.in_flight == 0
+    assert streaming.LONG_LIVED_CONNECTIONS == {}
+
+
+def test_non_event_stream_reply_is_buffered(streaming_session, user_groups):
+    session = streaming_session("application/json", [b'{"a": ', b"1}"])
+
+    status_code, _, body = run(
+        call_asgi(
+            FastPathRouter(None),
+            "GET",
+            "/demo/api/v1/example/endpoint3/events",
+            {"Accept": "text/event-stream, application/json"}
+        )
+    )
+
+    assert (status_code, body) == (200, b'{"a": 1}')
+    assert session.response.released
+    assert streaming.LONG_LIVED_CONNECTIONS == {}
+
+
+def test_buffered_reply_respects_the_request_deadline(streaming_session, user_groups):
+    session = streaming_session("application/json", [b"{}"])
+    session.response.read_delay = 5
+
+    start_time = time.time()
+    status_code, _, _ = run(
+        call_asgi(
+            FastPathRouter(None),
+            "GET",
+            "/demo/api/v1/example/endpoint3/events",
+            {"Accept": "text/event-stream", DEADLINE_HEADER: "100"}
+        )
+    )
+
+    assert status_code == 504
+    assert time.time() - start_time < 1
+    assert session.response.released
+    assert streaming.LONG_LIVED_CONNECTIONS == {}
+
+
+def test_event_stream_is_rejected_when_upstream_is_full(monkeypatch, streaming_session, user_groups):
+    session = streaming_session("text/event-stream", [])
+    monkeypatch.setattr(streaming, "MAX_LONG_LIVED_CONNECTIONS_PER_UPSTREAM", 0)
+
+    status_code, _, _ = run(
+        call_asgi(FastPathRouter(None), "GET", "/demo/api/v1/example/endpoint3/events", {"Accept": "text/event-stream"})
+    )
+
+    assert status_code == 503
+    assert session.calls == []
+
+
+class FakeWebSocket:
+    def __init__(self, messages, delay: float = 0):
+        self.messages = list(messages)
+        self.delay = delay
+        self.sent = []
+        self.close_code = None
+
+    async def receive(self):
+        await asyncio.sleep(self.delay)
+        if self.messages:
+            return self.messages.pop(0)
+        await asyncio.Event().wait()
+
+    async def send_text(self, data):
+        self.sent.append(data)
+
+    async def send_bytes(self, data):
+        self.sent.append(data)
+
+    async def close(self, code: int = 1000):
+        self.close_code = code
+
+
+class FakeWSMessage:
+    def __init__(self, type, data=None):
+        self.type = type
+        self.data = data
+
+
+class FakeUpstreamWebSocket:
+    def __init__(self, messages, delay: float = 0):
+        self.messages = list(messages)
+        self.delay = delay
+        self.sent = []
+        self.closed = False
+        self.close_code = None
+
+    async def receive(self):
+        await asyncio.sleep(self.delay)
+        if self.messages:
+            return self.messages.pop(0)
+        await asyncio.Event().wait()
+
+    async def send_str(self, data):
+        self.sent.append(data)
+
+    async def send_bytes(self, data):
+        self.sent.append(data)
+
+    async def close(self):
+        self.closed = True
+
+
+def test_websocket_frames_are_relayed_both_ways():
+    websocket = FakeWebSocket(
+        [
+            {"type": "websocket.receive", "text": "hello"},
+            {"type": "websocket.receive", "bytes": b"\x00\x01"},
+            {"type": "websocket.disconnect", "code": 1000},
+        ],
+        delay=0.01
+    )
+    upstream = FakeUpstreamWebSocket(
+        [FakeWSMessage(WSMsgType.TEXT, "welcome"), FakeWSMessage(WSMsgType.BINARY, b"\x02")]
+    )
+
+    run(streaming.relay_websocket_frames(websocket, upstream, idle_timeout=1))
+
+    assert upstream.sent == ["hello", b"\x00\x01"]
+    assert websocket.sent == ["welcome", b"\x02"]
+    assert upstream.closed
+
+
+def test_upstream_close_closes_client():
+    websocket = FakeWebSocket([])
+    upstream = FakeUpstreamWebSocket([FakeWSMessage(WSMsgType.CLOSE, 4000)])
+    upstream.close_code = 4000
+
+    run(streaming.relay_websocket_frames(websocket, upstream, idle_timeout=1))
+
+    assert websocket.close_code == 4000
+
+
+def test_idle_websocket_is_closed():
+    websocket = FakeWebSocket([])
+    upstream = FakeUpstreamWebSocket([])
+
+    async def execute():
+        with request_cycle_context({"X-Request-ID": "streaming-request"}):
+            await asyncio.wait_for(streaming.relay_websocket_frames(websocket, upstream, idle_timeout=0.05), 1)
+
+    run(execute())
+
+    assert upstream.closed
+    assert websocket.close_code == 1000
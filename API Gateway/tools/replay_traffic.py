@@ -0,0 +1,358 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import datetime
+import statistics
+import jwt
+from collections import Counter
+from typing import Dict, Any, List, Optional, Iterator
+from aiohttp import ClientSession, ClientTimeout
+
+
+# Must match utils.constants.ALGORITHM so the gateway accepts the minted tokens
+ALGORITHM = "HS256"
+ACCESS_LOG_MESSAGE = "API request"
+PERCENTILES = (50, 90, 95, 99)
+
+
+def unwrap_event(raw_event: Dict[str, Any]) -> Dict[str, Any]:
+    # Splunk exports wrap the original record in "result"/"event", sometimes with the JSON left in "_raw"
+    for key in ("result", "event"):
+        if isinstance(raw_event.get(key), dict):
+            raw_event = raw_event[key]
+
+    if isinstance(raw_event.get("_raw"), str):
+        raw_event = json.loads(raw_event["_raw"])
+
+    return raw_event
+
+
+def read_access_events(path: str) -> Iterator[Dict[str, Any]]:
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+
+            try:
+                event = unwrap_event(json.loads(line))
+            except (ValueError, TypeError):
+                print(f"Skipping line {line_number}: not a JSON event", file=sys.stderr)
+                continue
+
+            if event.get("message") != ACCESS_LOG_MESSAGE or "request" not in event or "response" not in event:
+                continue
+
+            yield event
+
+
+def parse_timestamp(timestamp: str) -> float:
+    # isoformat() omits the fractional part when the microseconds are 0
+    return datetime.datetime.fromisoformat(timestamp.rstrip("Z")).replace(
+        tzinfo=datetime.timezone.utc
+    ).timestamp()
+
+
+def load_replay_plan(path: str, include_paths: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    plan = []
+    for event in read_access_events(path):
+        request = event["request"]
+        if include_paths and not any(str(request.get("path")).startswith(prefix) for prefix in include_paths):
+            continue
+
+        try:
+            plan.append(
+                {
+                    "timestamp": parse_timestamp(event["timestamp"]),
+                    "method": request["method"],
+                    "path": request["path"],
+                    "query_params": request.get("query_params", ""),
+                    "username": event.get("user", {}).get("username"),
+                    "recorded_status_code": event["response"]["status_code"],
+                    "recorded_response_time_ms": event["response"]["response_time_ms"],
+                }
+            )
+        except (KeyError, ValueError, TypeError) as e:
+            print(f"Skipping malformed access event {event.get('X-Request-ID')}: {e!r}", file=sys.stderr)
+
+    plan.sort(key=lambda entry: entry["timestamp"])
+    if plan:
+        start = plan[0]["timestamp"]
+        for entry in plan:
+            entry["offset"] = entry["timestamp"] - start
+
+    return plan
+
+
+def mint_tokens(usernames: List[str], secret_key: str) -> Dict[str, str]:
+    expiration = datetime.datetime.utcnow() + datetime.timedelta(hours=8)
+    return {
+        username: jwt.encode({"sub": username, "exp": expiration}, secret_key, algorithm=ALGORITHM)
+        for username in usernames
+    }
+
+
+async def replay_request(
+        session: ClientSession,
+        base_url: str,
+        entry: Dict[str, Any],
+        tokens: Dict[str, str],
+        semaphore: asyncio.Semaphore,
+        results: List[Dict[str, Any]]
+) -> None:
+    headers = {"User-Agent": "gateway-traffic-replay"}
+    if entry["username"] in tokens:
+        headers["Authorization"] = f"Bearer {tokens[entry['username']]}"
+
+    async with semaphore:
+        start_time = time.perf_counter()
+        try:
+            async with session.request(
+                    method=entry["method"],
+                    url=f"{base_url}{entry['path']}{entry['query_params']}",
+                    headers=headers,
+            ) as response:
+                await response.read()
+                status_code = response.status
+        except Exception as e:
+            print(f"{entry['method']} {entry['path']} failed: {e!r}", file=sys.stderr)
+            status_code = None
+        results.append(
+            {
+                **entry,
+                "status_code": status_code,
+                "response_time_ms": (time.perf_counter() - start_time) * 1000,
+            }
+        )
+
+
+async def replay(
+        plan: List[Dict[str, Any]],
+        base_url: str,
+        tokens: Dict[str, str],
+        speed: Optional[float],
+        concurrency: int,
+        timeout: float
+) -> List[Dict[str, Any]]:
+    results = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with ClientSession(timeout=ClientTimeout(total=timeout)) as session:
+        tasks = []
+        replay_start = time.perf_counter()
+        for entry in plan:
+            if speed is not None:
+                delay = entry["offset"] / speed - (time.perf_counter() - replay_start)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+            tasks.append(asyncio.create_task(replay_request(session, base_url, entry, tokens, semaphore, results)))
+
+        await asyncio.gather(*tasks)
+
+    return results
+
+
+def percentile(values: List[float], percent: int) -> float:
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[percent - 1]
+
+
+def latency_summary(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {}
+
+    summary = {"mean": statistics.mean(values)}
+    summary.update({f"p{percent}": percentile(values, percent) for percent in PERCENTILES})
+    summary["max"] = max(values)
+    return summary
+
+
+async def measure_baseline_rtt(base_url: str, samples: int, timeout: float) -> Optional[float]:
+    # /healthz is answered by the outermost middleware, so its latency is mostly network and connection overhead
+    latencies = []
+    async with ClientSession(timeout=ClientTimeout(total=timeout)) as session:
+        for _ in range(samples):
+            start_time = time.perf_counter()
+            try:
+                async with session.get(f"{base_url}/healthz") as response:
+                    await response.read()
+                    if response.status != 200:
+                        return None
+            except Exception as e:
+                print(f"Could not measure the baseline round trip: {e!r}", file=sys.stderr)
+                return None
+            latencies.append((time.perf_counter() - start_time) * 1000)
+
+    return statistics.median(latencies) if latencies else None
+
+
+def compare_results(results: List[Dict[str, Any]], baseline_rtt_ms: Optional[float] = None) -> Dict[str, Any]:
+    # Both latency distributions are computed over the requests that got a response on replay.
+    # Recorded latencies are measured inside the gateway, replayed ones end to end by this client,
+    # so the baseline round trip is subtracted from the replayed ones when it is known
+    completed = [result for result in results if result["status_code"] is not None]
+    recorded_latencies = [result["recorded_response_time_ms"] for result in completed]
+    replayed_latencies = [result["response_time_ms"] for result in completed]
+    mismatches = Counter(
+        (result["method"], result["path"], result["recorded_status_code"], result["status_code"])
+        for result in results
+        if result["status_code"] != result["recorded_status_code"]
+    )
+
+    return {
+        "requests": len(results),
+        "failed_requests": len(results) - len(completed),
+        "baseline_rtt_ms": baseline_rtt_ms,
+        "latency_ms": {
+            "recorded_gateway_side": latency_summary(recorded_latencies),
+            "replayed_client_side": latency_summary(replayed_latencies),
+            "replayed_minus_baseline_rtt": latency_summary(
+                [max(latency - baseline_rtt_ms, 0) for latency in replayed_latencies] if baseline_rtt_ms is not None else []
+            ),
+        },
+        "status_codes": {
+            "recorded": dict(Counter(result["recorded_status_code"] for result in results)),
+            "replayed": dict(Counter(result["status_code"] for result in results)),
+        },
+        "status_code_mismatches": sum(mismatches.values()),
+        "top_mismatches": [
+            {
+                "method": method,
+                "path": path,
+                "recorded_status_code": recorded,
+                "replayed_status_code": replayed,
+                "count": count
+            }
+            for (method, path, recorded, replayed), count in mismatches.most_common(10)
+        ],
+    }
+
+
+def format_latency(value: Optional[float], signed: bool = False) -> str:
+    if value is None:
+        return f"{'-':>12}"
+
+    return f"{value:>+12.2f}" if signed else f"{value:>12.2f}"
+
+
+def print_report(report: Dict[str, Any], elapsed: float) -> None:
+    print(f"Replayed {report['requests']} requests in {elapsed:.2f}s ({report['requests'] / elapsed:.1f} req/s)")
+    print(f"Requests without a response (excluded from latencies): {report['failed_requests']}")
+    if report["baseline_rtt_ms"] is None:
+        print("Baseline round trip: unknown, replayed latencies include network and connection overhead")
+    else:
+        print(f"Baseline round trip to /healthz: {report['baseline_rtt_ms']:.2f}ms (median)")
+    print()
+    print("recorded = time inside the gateway (access log), replayed = end to end as seen by this client,")
+    print("adjusted = replayed minus the baseline round trip; delta compares adjusted with recorded")
+    print(f"{'latency (ms)':<14}{'recorded':>12}{'replayed':>12}{'adjusted':>12}{'delta':>12}")
+    latency_ms = report["latency_ms"]
+    for stat, recorded in latency_ms["recorded_gateway_side"].items():
+        replayed = latency_ms["replayed_client_side"].get(stat)
+        adjusted = latency_ms["replayed_minus_baseline_rtt"].get(stat)
+        delta = adjusted - recorded if adjusted is not None else None
+        print(
+            f"{stat:<14}{format_latency(recorded)}{format_latency(replayed)}"
+            f"{format_latency(adjusted)}{format_latency(delta, signed=True)}"
+        )
+    print()
+    print(f"{'status code':<14}{'recorded':>12}{'replayed':>12}")
+    status_codes = set(report["status_codes"]["recorded"]) | set(report["status_codes"]["replayed"])
+    for status_code in sorted(status_codes, key=str):
+        print(
+            f"{str(status_code):<14}"
+            f"{report['status_codes']['recorded'].get(status_code, 0):>12}"
+            f"{report['status_codes']['replayed'].get(status_code, 0):>12}"
+        )
+    print()
+    print(f"Status code mismatches: {report['status_code_mismatches']}")
+    for mismatch in report["top_mismatches"]:
+        print(
+            f"  {mismatch['count']:>6}x {mismatch['method']} {mismatch['path']}: "
+            f"{mismatch['recorded_status_code']} -> {mismatch['replayed_status_code']}"
+        )
+
+
+def parse_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Replay API Gateway access logs against a gateway instance and compare the results"
+    )
+    parser.add_argument("log_file", help="File with one JSON access event (as produced by LoggingMiddleware) per line")
+    parser.add_argument("--target", default="http://localhost:8000", help="Base URL of the gateway to replay against")
+    parser.add_argument(
+        "--rate",
+        choices=("original", "max"),
+        default="original",
+        help="Replay with the recorded inter-arrival times or as fast as the concurrency limit allows"
+    )
+    parser.add_argument(
+        "--speed",
+        type=float,
+        help="Multiplier applied to the original rate (e.g. 2 replays twice as fast); only valid with --rate original"
+    )
+    parser.add_argument("--concurrency", type=int, default=100, help="Maximum number of requests in flight")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Total timeout per replayed request in seconds")
+    parser.add_argument("--path-prefix", action="append", help="Only replay requests whose path starts with this prefix")
+    parser.add_argument(
+        "--baseline-samples",
+        type=int,
+        default=20,
+        help="Requests to /healthz used to measure the baseline round trip (0 to skip)"
+    )
+    parser.add_argument("--report", help="Also write the comparison report as JSON to this file")
+    return parser.parse_args()
+
+
+def main() -> None:
+    arguments = parse_arguments()
+    if arguments.speed is not None and arguments.rate == "max":
+        sys.exit("--speed cannot be combined with --rate max")
+    if arguments.speed is not None and arguments.speed <= 0:
+        sys.exit("--speed must be greater than 0")
+
+    plan = load_replay_plan(arguments.log_file, arguments.path_prefix)
+    if not plan:
+        sys.exit(f"No access events found in {arguments.log_file}")
+
+    usernames = sorted({entry["username"] for entry in plan if entry["username"]})
+    tokens = {}
+    if usernames:
+        secret_key = os.getenv("TOKEN_SECRET_KEY")
+        if not secret_key:
+            sys.exit("TOKEN_SECRET_KEY must be set to mint tokens for the logged users")
+        tokens = mint_tokens(usernames, secret_key)
+
+    baseline_rtt_ms = None
+    if arguments.baseline_samples > 0:
+        baseline_rtt_ms = asyncio.run(
+            measure_baseline_rtt(arguments.target.rstrip("/"), arguments.baseline_samples, arguments.timeout)
+        )
+
+    start_time = time.perf_counter()
+    results = asyncio.run(
+        replay(
+            plan,
+            arguments.target.rstrip("/"),
+            tokens,
+            (arguments.speed or 1.0) if arguments.rate == "original" else None,
+            arguments.concurrency,
+            arguments.timeout,
+        )
+    )
+    elapsed = time.perf_counter() - start_time
+
+    report = compare_results(results, baseline_rtt_ms)
+    print_report(report, elapsed)
+
+    if arguments.report:
+        with open(arguments.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, default=str)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,8 @@
-from fastapi import FastAPI, Request
+import json
+import asyncio
+import itertools
+from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
 from utils.splunk_logging import logger
 
 app = FastAPI(title="Demo APP")
@@ -20,4 +24,22 @@ async def root2():
 
 @app.get("/example/endpoint3/{something}")
 async def root3(something):
-    return {"message": f"This is endpoint 3 - {something}"}
\ No newline at end of file
+    return {"message": f"This is endpoint 3 - {something}"}
+
+@app.get("/example/events")
+async def events(interval: float = 1):
+    async def generate_events():
+        for index in itertools.count():
+            yield f"data: {json.dumps({'event': index})}\n\n"
+            await asyncio.sleep(interval)
+
+    return StreamingResponse(generate_events(), media_type="text/event-stream")
+
+@app.websocket("/example/ws")
+async def echo(websocket: WebSocket):
+    await websocket.accept()
+    try:
+        while True:
+            await websocket.send_text(await websocket.receive_text())
+    except WebSocketDisconnect:
+        pass